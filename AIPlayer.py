@@ -0,0 +1,138 @@
+#!/usr/bin/python
+
+# This class represents a computer player.  On its turn it finds every
+# legal move for its rack with the move generator, picks the one its
+# evaluation function likes best, and plays it through the same buttons a
+# person would use (SUBMIT to play, PASS/EXCHANGE otherwise).
+#
+# An evaluation function takes (game, player, move) and returns a number;
+# higher is better.  The default just takes the highest-scoring move.
+#
+# If processes is given, moves are generated by that many worker processes
+# at once (see MoveGen.allMovesParallel), and every move is looked at
+# whatever the time limit.
+#
+# If candidates is given, that many of the best moves by the evaluation are
+# then simulated (see Simulation) and the one with the highest equity is
+# played.  The time limit covers the simulation too, but the simulation
+# only checks it between rounds.
+#
+# Once the bag is empty in a two-player game, the player searches the rest
+# of the game instead (see Endgame), for up to endgameTime seconds, but no
+# longer than the time limit.
+
+import time
+import Player
+import MoveGen
+import Simulation
+import Endgame
+import debug
+from letters import tileFor
+
+# Seconds a computer player may spend looking for a move
+TIME_LIMIT = 0.2
+
+# Evaluation that values a move by its score alone
+def scoreEvaluation(game, player, move):
+    return move.score
+
+class AIPlayer(Player.Player):
+    def __init__(self, game, name, evaluate=scoreEvaluation,
+            timeLimit=TIME_LIMIT, processes=None, candidates=None,
+            iterations=Simulation.ITERATIONS, endgameTime=Endgame.TIME_LIMIT):
+        Player.Player.__init__(self, game, name)
+        self.evaluate = evaluate
+        self.timeLimit = timeLimit
+        self.processes = processes
+        self.candidates = candidates
+        self.iterations = iterations
+        self.endgameTime = endgameTime
+
+    def takeTurn(self, game):
+        assert len(self.rack) <= 7, "Rack too long"
+
+        if self.newTurn is True:
+            self.drawTiles(game)
+            self.canChallenge = True
+        game.display.drawStatus(game)
+
+        if debug.level >= debug.INFO:
+            start = time.time()
+        move = self.chooseMove(game)
+        if debug.level >= debug.INFO:
+            debug.log(debug.INFO, "move", turn=game.turnNumber,
+                    player=self.name, rack="".join(self.rack),
+                    tiles=move and move.tiles, score=move and move.score,
+                    seconds=round(time.time() - start, 3))
+        if move is not None:
+            self.playMove(game, move)
+        elif len(game.bag) >= 7:
+            self.exchange(game, self.rack)
+        else:
+            self.passTurn(game)
+
+    # Returns the best move by the player's evaluation (or by simulation,
+    # if the player simulates candidates, or by searching the endgame), or
+    # None if there are no legal moves or passing is best.  Moves are
+    # looked at as they are generated; if the time limit runs out, the best
+    # move found so far is used.
+    def chooseMove(self, game):
+        if self.endgameTime is not None and len(game.bag) == 0 and \
+                len(game.roster) == 2:
+            return Endgame.solve(game, self,
+                    min(self.endgameTime, self.timeLimit)).move()
+
+        start = time.time()
+        deadline = start + self.timeLimit
+        best = None
+        bestValue = None
+        ranked = [] # (value, move) for every move, if simulating
+        if self.processes is not None:
+            moves = MoveGen.allMovesParallel(game.board, self.rack,
+                    game.lexicon, self.processes)
+            deadline = None
+        else:
+            moves = MoveGen.generateMoves(game.board, self.rack, game.lexicon)
+        for move in moves:
+            value = self.evaluate(game, self, move)
+            if best is None or value > bestValue:
+                best = move
+                bestValue = value
+            if self.candidates:
+                ranked.append((value, move))
+            if deadline is not None and time.time() > deadline:
+                break
+
+        if len(ranked) > 1:
+            ranked.sort(key=lambda pair: -pair[0])
+            moves = [move for value, move in ranked[:self.candidates]]
+            timeLeft = max(start + self.timeLimit - time.time(), 0)
+            results = Simulation.simulate(game, self, moves, self.iterations,
+                    timeLimit=timeLeft, processes=self.processes)
+            best = results[0].move
+        return best
+
+    # The computer trusts every play
+    def wantsChallenge(self, game, outPlayer):
+        return False
+
+    # Puts a move's tiles on the board and submits them
+    def playMove(self, game, move):
+        for x, y, letter in move.tiles:
+            game.board.changeLetter(x, y, letter)
+            self.addToUsed(game, game.board.square(x, y))
+            self.removeFromRack(game, tileFor(letter))
+            game.display.redrawSquare(x, y, game.board)
+        game.submitButton.click(game, self)
+
+    # Swaps tiles with the bag, as the exchange screen would
+    def exchange(self, game, tiles):
+        for tile in list(tiles):
+            game.passButton.push(game, self, ord(tile))
+        game.passButton.exchange(game, self)
+
+    # Passes without exchanging (the bag is too small to exchange)
+    def passTurn(self, game):
+        game.display.clearMsg()
+        game.display.printMsg(self.name + " passed")
+        game.scorelessTurn()
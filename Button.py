@@ -2,9 +2,20 @@
 
 from constants import *
 import re
-import random
+from collections import OrderedDict
 import Display
 import Play
+import debug
+import MoveGen
+import Endgame
+import zobrist
+from letters import tileFor
+
+# Plays shown by the hint button
+HINTS = 3
+
+# Positions whose hints are remembered
+HINT_CACHE_SIZE = 64
 
 class Button:
     def __init__(self, name, xstart, ystart, length):
@@ -56,7 +67,7 @@ class PassButton(Button):
                     self.pop(game, player)
                 game.repeatTurn() # Allow player to "take another turn"
                 break
-            elif c == KEY_Q: # Quit game
+            elif c == KEY_Q or c == KEY_EOF: # Quit game
                 game.endGame()
                 break
             elif re.match("[A-Z]|\.", chr(c)): # Add tile to exchange rack
@@ -65,17 +76,18 @@ class PassButton(Button):
             else:
                 pass
     
-    # Exchange tiles currently on exchange rack
+    # Exchange tiles currently on exchange rack (with none, this is a pass)
     def exchange(self, game, player):
         game.display.clearMsg()
-        while len(player.rack) < 7:
-            tile = random.choice(game.bag)
-#            player.rack.append(tile)
-            player.addToRack(game, tile)
-            game.bag.remove(tile)
-        for tile in player.exchanged:
-            game.bag.append(tile)
+        drawn = []
+        while len(player.rack) < 7 and len(game.bag) > 0:
+            drawn.append(game.bag.draw())
+            player.addToRack(game, drawn[-1])
+        if game.journal is not None and (drawn or player.exchanged):
+            game.journal.exchange(player, player.exchanged, drawn)
+        game.bag.addTiles(player.exchanged)
         player.exchanged = []
+        game.scorelessTurn()
 #        game.display.redrawRack(player)
     
     # Remove one tile from exchange rack
@@ -136,16 +148,11 @@ class ChallengeButton(Button):
         player.canChallenge = False # Do not allow player to challenge twice
         
         assert len(game.plays) > 0, "No plays in stack"
-        lastPlay = game.plays.pop()
-        if lastPlay.isValid(game): # Challenge unsuccessful
-            game.plays.append(lastPlay)
-        else:
-            # Reduce score
-            lastPlay.player.score -= lastPlay.score
+        # The play's words were checked when it was submitted
+        if not game.plays[-1].isValid(game): # Challenge successful
             # Remove tiles from board, returning them to player's rack
+            lastPlay = game.withdrawPlay()
             for square in lastPlay.squares:
-                lastPlay.player.rack.append(square.letter)
-                game.board.changeLetter(square.x, square.y, None)
                 game.display.redrawSquare(square.x, square.y, game.board)
             game.repeatTurn() # Allow player to "take another turn"
 
@@ -161,16 +168,93 @@ class RecallButton(Button):
         recall(game, player)
         game.repeatTurn()
 
-# Undo button - not currently implemented
-#class UndoButton(Button):
-#    def __init__(self):
-#        self.name = "UNDO"
-#        self.xstart = UNDO_X
-#        self.ystart = UNDO_Y
-#        self.length = 4
-#
-#    def click(self, game, player):
-#        pass
+# Takes back the player's last turn, and every turn since (see
+# History.undoTurnOf), so the player can play it again
+class UndoButton(Button):
+    def __init__(self):
+        self.name = "UNDO"
+        self.xstart = UNDO_X
+        self.ystart = UNDO_Y
+        self.length = 4
+
+    def click(self, game, player):
+        recall(game, player)
+        records = game.history.undoTurnOf(player)
+        game.display.clearMsg()
+        if len(records) == 0:
+            game.display.printMsg("No turns to take back")
+            game.repeatTurn()
+            return
+        # The player is back at the start of their last turn
+        game.display.drawScreen(game)
+        game.display.printMsg("Took back " + str(len(records)) + \
+                (len(records) == 1 and " turn" or " turns"))
+        if game.journal is not None:
+            game.journal.snapshot()
+
+# Shows the highest-scoring plays for the player's rack.  Once the bag is
+# empty in a two-player game, the best play from an endgame search comes
+# first.  Hints go by the position at the start of the turn (tiles put down
+# this turn count as still on the rack), and are remembered for the last
+# HINT_CACHE_SIZE positions, so asking again after shuffling or recalling
+# the rack, or after putting tiles down, is instant.
+class HintButton(Button):
+    def __init__(self):
+        self.name = "HINT"
+        self.xstart = HINT_X
+        self.ystart = HINT_Y
+        self.length = 4
+        self.cache = OrderedDict() # (board hash, rack) -> lines to show
+
+    def click(self, game, player):
+        game.display.clearMsg()
+        for i, line in enumerate(self.hints(game, player)):
+            game.display.printMsg(line, vertOffset = i)
+        game.repeatTurn() # Take another turn
+
+    # Returns the lines to show for a hint, working them out if the
+    # position isn't in the cache
+    def hints(self, game, player):
+        rack = list(player.rack)
+        key = game.board.hash
+        for square in player.used:
+            rack.append(tileFor(square.letter))
+            key ^= zobrist.squareKeys[square.y * BOARDSIZE_X + square.x][
+                    square.letter]
+        key = (key, tuple(sorted(rack)))
+        lines = self.cache.pop(key, None)
+        if lines is None:
+            lines = self.findHints(game, player, rack)
+            if len(self.cache) >= HINT_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        self.cache[key] = lines # Most recently used goes last
+        return lines
+
+    # Works out the lines to show for a hint for a rack, on the board
+    # without the tiles put down this turn
+    def findHints(self, game, player, rack):
+        board = game.board
+        if len(player.used) > 0:
+            board = board.copy()
+            for square in player.used:
+                board.changeLetter(square.x, square.y, None)
+        moves = MoveGen.allMoves(board, rack, game.lexicon)
+        lines = []
+        if len(game.bag) == 0 and len(game.roster) == 2:
+            opponent = [other for other in game.roster
+                    if other is not player][0]
+            solver = Endgame.Solver(board, [rack, opponent.rack],
+                    game.lexicon)
+            best = solver.solve(passes=min(game.scoreless, 1)).move()
+            if best is None:
+                lines.append("Endgame: pass")
+            else:
+                lines.append("Endgame: " + describeMove(best))
+                moves = [move for move in moves if move.tiles != best.tiles]
+        if len(moves) == 0 and len(lines) == 0:
+            return ["No plays; pass or exchange"]
+        lines.extend([describeMove(move) for move in moves])
+        return lines[:HINTS]
 
 class ShuffleButton(Button):
     def __init__(self):
@@ -195,6 +279,10 @@ class SubmitButton(Button):
             game.repeatTurn()
             return
         play = Play.Play(game, player)
+        if debug.level >= debug.DEBUG:
+            debug.log(debug.DEBUG, "play", turn=game.turnNumber,
+                    player=player.name, words=play.words, score=play.score,
+                    legal=play.isLegal(game), valid=play.isValid(game))
         # Invalid plays
         if not play.isLegal(game) or (not game.challenge and not play.isValid(game)):
             game.display.clearMsg()
@@ -205,17 +293,22 @@ class SubmitButton(Button):
             game.display.clearMsg()
             game.display.printMsg(player.name + " scored " + \
                     str(play.score) + " points!")
-            game.plays.append(play)
-            player.score += play.score
-            player.newTurn = True
-        player.used = []
+            game.scorePlay(play)
+        player.clearUsed()
 
 # Brings tiles back to rack
 def recall(game, player):
     for square in player.used:
-        player.addToRack(game, square.letter)
+        player.addToRack(game, tileFor(square.letter))
 #        player.rack.append(square.letter)
         game.board.changeLetter(square.x, square.y, None)
         game.display.redrawSquare(square.x, square.y, game.board)
 #        game.display.redrawRack(player)
-    player.used = []
+    player.clearUsed()
+
+# Describes a move from MoveGen for a hint, such as "CAT at (7, 7) across
+# for 10", where (7, 7) is the square of its first new tile
+def describeMove(move):
+    x, y = move.tiles[0][:2]
+    return "%s at (%d, %d) %s for %d" % (move.words[0], x, y,
+            move.horizontal and "across" or "down", move.score)
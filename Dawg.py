@@ -0,0 +1,289 @@
+#!/usr/bin/python
+
+# Word graphs for walking the lexicon a letter at a time.
+#
+# A Dawg is a minimized directed acyclic word graph: a trie of the word list
+# in which identical subtrees are shared.  A Gaddag holds, for every word
+# and every split point in it, the reversed prefix, a separator and then
+# the rest of the word (for "CAT": "C>AT", "AC>T" and "TAC"), so a word can
+# be built outwards in both directions from any letter in it.  Both are
+# minimized the same way.
+#
+# The move generator walks the Gaddag (see MoveGen), and the Dawg gives
+# the cross-checks the board keeps for it (see Lexicon.crossCheck).
+#
+# Nodes are numbered from 0 (the root) and kept in flat arrays rather than
+# Python objects.  The edges leaving node n are the entries first[n] up to
+# first[n+1] of labels (one character per edge) and targets (the node the
+# edge leads to).  terminal[n] is "\x01" if the path to n spells a word.
+
+import os
+import sys
+import struct
+from array import array
+import Lexicon
+
+# Cache file layout (all integers little-endian): header, then first as
+# (numNodes + 1) int32, targets as numEdges int32, labels as numEdges
+# bytes and terminal as numNodes bytes
+MAGIC = "DAWG"
+VERSION = 1
+HEADER = struct.Struct("<4sIQd20sII")
+SEPARATOR = ">"
+
+class Dawg:
+    suffix = ".dawg"
+
+    def __init__(self, first, targets, labels, terminal):
+        self.first = first
+        self.targets = targets
+        self.labels = labels
+        self.terminal = terminal
+        self.root = 0
+
+    # Returns the node reached by following the edge labelled letter, or
+    # None if there is no such edge
+    def child(self, node, letter):
+        i = self.labels.find(letter, self.first[node], self.first[node + 1])
+        if i < 0:
+            return None
+        return self.targets[i]
+
+    # Returns a list of (letter, node) pairs for the edges leaving a node
+    def children(self, node):
+        start = self.first[node]
+        end = self.first[node + 1]
+        return zip(self.labels[start:end], self.targets[start:end])
+
+    # Follows a string of letters from a node (the root by default).
+    # Returns the node reached, or None if the letters fall off the graph.
+    def walk(self, letters, node=0):
+        first = self.first
+        labels = self.labels
+        targets = self.targets
+        for letter in letters:
+            i = labels.find(letter, first[node], first[node + 1])
+            if i < 0:
+                return None
+            node = targets[i]
+        return node
+
+    # Checks to see if the path to a node spells a whole word
+    def isTerminal(self, node):
+        return self.terminal[node] == "\x01"
+
+    def isWord(self, word):
+        node = self.walk(word)
+        return node is not None and self.terminal[node] == "\x01"
+
+    # Checks to see if any word starts with the given letters
+    def isPrefix(self, letters):
+        return self.walk(letters) is not None
+
+    # Returns every word below a node that matches a pattern, where "." in
+    # the pattern matches any letter.  prefix is the string that leads to
+    # the node.
+    def match(self, pattern, node=0, prefix=""):
+        matches = []
+        self.matchFrom(pattern, 0, node, prefix, matches)
+        return matches
+
+    def matchFrom(self, pattern, i, node, prefix, matches):
+        if i == len(pattern):
+            if self.terminal[node] == "\x01":
+                matches.append(prefix)
+            return
+        letter = pattern[i]
+        if letter == ".":
+            for letter, nextNode in self.children(node):
+                if letter != SEPARATOR:
+                    self.matchFrom(pattern, i + 1, nextNode, prefix + letter,
+                            matches)
+        else:
+            nextNode = self.child(node, letter)
+            if nextNode is not None:
+                self.matchFrom(pattern, i + 1, nextNode, prefix + letter,
+                        matches)
+
+    # Number of nodes and edges in the graph
+    def size(self):
+        return len(self.terminal), len(self.labels)
+
+class Gaddag(Dawg):
+    suffix = ".gaddag"
+
+    # A whole word is stored reversed, with no separator
+    def isWord(self, word):
+        return Dawg.isWord(self, word[::-1])
+
+    def match(self, pattern):
+        return [word[::-1] for word in Dawg.match(self, pattern[::-1])]
+
+    # Returns the node for words containing the given letters: the letters
+    # reversed, then the separator.  From there, the graph spells out
+    # every way of finishing such a word to the right.
+    def walkInfix(self, letters):
+        node = self.walk(letters[::-1])
+        if node is None:
+            return None
+        return self.child(node, SEPARATOR)
+
+    # Returns every word ending with the given letters
+    def endingWith(self, letters):
+        node = self.walk(letters[::-1])
+        if node is None:
+            return []
+        words = []
+        self.collectReversed(node, letters, words)
+        return words
+
+    # Collects the words below a node on the reversed-prefix side of the
+    # graph; word is the part of the word spelled so far.
+    def collectReversed(self, node, word, words):
+        if self.terminal[node] == "\x01":
+            words.append(word)
+        for letter, nextNode in self.children(node):
+            if letter != SEPARATOR:
+                self.collectReversed(nextNode, letter + word, words)
+
+# Strings stored in the GADDAG for a word
+def gaddagEntries(word):
+    entries = [word[::-1]]
+    for i in range(1, len(word)):
+        entries.append(word[i-1::-1] + SEPARATOR + word[i:])
+    return entries
+
+# Builds a minimized graph from a sorted list of strings (Daciuk's
+# incremental algorithm).  While building, a node is a list of
+# [isTerminal, edges], where edges is a list of [letter, node].  Once every
+# string sharing a prefix with the current one has been added, the nodes
+# below that prefix can't change any more, so each is replaced with an
+# identical node seen before, if there is one.
+def build(strings, cls=Dawg):
+    register = {}
+    root = [False, []]
+    path = [root] # Nodes along the previous string
+    previous = ""
+
+    def minimize(depth):
+        for i in range(len(path) - 1, depth, -1):
+            node = path[i]
+            key = (node[0], tuple([(edge[0], id(edge[1])) for edge in node[1]]))
+            same = register.get(key)
+            if same is None:
+                register[key] = node
+            else:
+                path[i-1][1][-1][1] = same
+        del path[depth+1:]
+
+    for string in strings:
+        common = 0
+        limit = min(len(string), len(previous))
+        while common < limit and string[common] == previous[common]:
+            common += 1
+        minimize(common)
+        node = path[-1]
+        for letter in string[common:]:
+            nextNode = [False, []]
+            node[1].append([letter, nextNode])
+            path.append(nextNode)
+            node = nextNode
+        node[0] = True
+        previous = string
+    minimize(0)
+
+    # Number the nodes breadth first and flatten them into arrays
+    order = [root]
+    number = {id(root): 0}
+    first = array('i')
+    targets = array('i')
+    labels = []
+    terminal = []
+    i = 0
+    while i < len(order):
+        node = order[i]
+        first.append(len(targets))
+        terminal.append(node[0] and "\x01" or "\x00")
+        for letter, nextNode in node[1]:
+            if id(nextNode) not in number:
+                number[id(nextNode)] = len(order)
+                order.append(nextNode)
+            labels.append(letter)
+            targets.append(number[id(nextNode)])
+        i += 1
+    first.append(len(targets))
+    return cls(first, targets, "".join(labels), "".join(terminal))
+
+# Writes a graph to a cache file next to its word list
+def save(graph, filename, cacheFile):
+    stat = os.stat(filename)
+    numNodes, numEdges = graph.size()
+    tempFile = cacheFile + ".tmp"
+    cache = open(tempFile, 'wb')
+    cache.write(HEADER.pack(MAGIC, VERSION, stat.st_size, stat.st_mtime,
+            Lexicon.fileHash(filename), numNodes, numEdges))
+    cache.write(littleEndian(graph.first).tostring())
+    cache.write(littleEndian(graph.targets).tostring())
+    cache.write(graph.labels)
+    cache.write(graph.terminal)
+    cache.close()
+    os.rename(tempFile, cacheFile)
+
+# Reads a graph from a cache file, or returns None if the cache doesn't
+# exist or is out of date
+def read(cls, filename, cacheFile):
+    try:
+        cache = open(cacheFile, 'rb')
+    except IOError:
+        return None
+    data = cache.read()
+    cache.close()
+    if len(data) < HEADER.size:
+        return None
+    header = HEADER.unpack_from(data, 0)
+    if header[0] != MAGIC or header[1] != VERSION:
+        return None
+    if not Lexicon.cacheIsCurrent(filename, cacheFile, header, HEADER):
+        return None
+    numNodes, numEdges = header[5:7]
+    position = HEADER.size
+    first = array('i')
+    first.fromstring(data[position:position + 4 * (numNodes + 1)])
+    position += 4 * (numNodes + 1)
+    targets = array('i')
+    targets.fromstring(data[position:position + 4 * numEdges])
+    position += 4 * numEdges
+    labels = data[position:position + numEdges]
+    position += numEdges
+    terminal = data[position:position + numNodes]
+    return cls(littleEndian(first), littleEndian(targets), labels, terminal)
+
+# Converts between an array in native byte order and one in little-endian
+# order (the arrays are returned unchanged on little-endian machines)
+def littleEndian(values):
+    if sys.byteorder == "little":
+        return values
+    values = array(values.typecode, values)
+    values.byteswap()
+    return values
+
+# Loads the graph of a given class (Dawg or Gaddag) for a lexicon, building
+# and caching it if needed
+def load(lexicon, cls=Dawg):
+    filename = lexicon.filename
+    cacheFile = filename + cls.suffix
+    graph = read(cls, filename, cacheFile)
+    if graph is None:
+        if cls is Gaddag:
+            strings = []
+            for word in lexicon.iterWords():
+                strings.extend(gaddagEntries(word))
+            strings.sort()
+        else:
+            strings = lexicon.iterWords()
+        graph = build(strings, cls)
+        try:
+            save(graph, filename, cacheFile)
+        except (IOError, OSError):
+            pass # Can't write next to the word list; rebuild next time
+    return graph
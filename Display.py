@@ -1,12 +1,45 @@
 #!/usr/bin/python
 
-# This class represents the game display.
+# These classes represent the game display.  Display draws the game in a
+# terminal with curses; HeadlessDisplay draws nothing, so the game can run
+# without a terminal (for scripts and simulations).  Both have the same
+# methods, and the rest of the game only talks to the display through them.
+#
+# Display keeps a copy of what it has put on the screen (the shadow): the
+# character and attributes of every cell.  Drawing goes through put(),
+# which compares the text with the shadow and hands curses only the runs
+# of cells that changed, so repainting a message line or the whole board
+# costs no curses calls where nothing changed.  This saves work in this
+# process only: curses compares its own copy of the screen when it
+# updates, so what reaches the terminal is the same either way (see
+# benchmark.py render).  The screen is brought up to date once per
+# keypress, with noutrefresh and doupdate just before reading the key.
+# The cursor is kept apart from drawing: drawing doesn't move it, and it
+# goes back where the player left it before each update.
 
 import curses
 import random
+import sys
 from constants import *
 
-class Display:
+# Set this to False to draw every cell straight to curses without comparing
+# it with the shadow (for comparing the two; see benchmark.py render)
+DIFF_RENDERING = True
+
+# Things every display does the same way
+class DisplayBase:
+    # Check to see if coordinates are on screen
+    def onScreen(self, x, y):
+        if x in range(SCRSIZE_X) and y in range(SCRSIZE_Y):
+            return True
+        else:
+            return False
+
+    def shuffleRack(self, player):
+        random.shuffle(player.rack)
+        self.redrawRack(player)
+
+class Display(DisplayBase):
     def __init__(self, game):
         # Create the screen
         self.stdscr = curses.initscr()
@@ -27,47 +60,71 @@ class Display:
         # Special debug color
         curses.init_pair(DEBUG, curses.COLOR_BLACK, curses.COLOR_WHITE)
 
+        # The screen starts out blank
+        self.shadow = [[(" ", 0)] * SCRSIZE_X for y in range(SCRSIZE_Y)]
+        self.cursor = (CENTER_X, CENTER_Y)
+
         # Draw the screen
         self.drawScreen(game)
     
-    # Check to see if coordinates are on screen
-    def onScreen(self, x, y):
-        if x in range(SCRSIZE_X) and y in range(SCRSIZE_Y):
-            return True
-        else:
-            return False
-    
-    # Get one character of input
+    # Get one character of input, first bringing the screen up to date
     def getch(self):
+        self.update()
         return self.stdscr.getch()
 
+    # Sends everything drawn since the last update to the terminal in one
+    # go, and puts the cursor back
+    def update(self):
+        x, y = self.cursor
+        self.stdscr.move(y, x)
+        self.stdscr.noutrefresh()
+        curses.doupdate()
+
+    # Writes text at (x, y) with the given attributes, passing on to curses
+    # only the cells that differ from the shadow.  Text running off the
+    # right of the screen is cut off.
+    def put(self, x, y, text, attr=0):
+        text = text[:SCRSIZE_X - x]
+        if not DIFF_RENDERING:
+            self.stdscr.addstr(y, x, text, attr)
+            return
+        row = self.shadow[y]
+        start = None # Start of the run of changed cells
+        for i in range(len(text)):
+            cell = (text[i], attr)
+            if row[x + i] != cell:
+                row[x + i] = cell
+                if start is None:
+                    start = i
+            elif start is not None:
+                self.stdscr.addstr(y, x + start, text[start:i], attr)
+                start = None
+        if start is not None:
+            self.stdscr.addstr(y, x + start, text[start:], attr)
+
+    # Returns the (x, y) position of the cursor
+    def getCursor(self):
+        return self.cursor
+
     # Delete messages from screen
     def clearMsg(self, numLines = SCRSIZE_Y - MSG_Y - 1):
         for l in range(numLines): # number of lines to clear
-            for i in range(SCRSIZE_X - MSG_X):
-                self.stdscr.addch(MSG_Y + l, MSG_X + i, " ")
+            self.put(MSG_X, MSG_Y + l, " " * (SCRSIZE_X - MSG_X))
     
     # Print messages to screen
     def printMsg(self, msg, vertOffset = 0):
         assert vertOffset < SCRSIZE_Y - MSG_Y - 1, "Error message off screen"
-        self.stdscr.addstr(MSG_Y + vertOffset, MSG_X, msg)
+        self.put(MSG_X, MSG_Y + vertOffset, msg)
         
     def redrawRack(self, player):
         if player is None:
             return
-        for i in range(7):
-            self.stdscr.addch(RACK_Y, RACK_X + i, " ")
-        for i in range(len(player.rack)):
-            self.stdscr.addch(RACK_Y, RACK_X + i, player.rack[i])
         assert RACK_X >= 11, "Rack too far to left"
-        self.stdscr.addstr(RACK_Y, RACK_X - 11, "Your rack: ")
-
-    def shuffleRack(self, player):
-        random.shuffle(player.rack)
-        self.redrawRack(player)
+        self.put(RACK_X - 11, RACK_Y, "Your rack: " + \
+                "".join(player.rack).ljust(7))
 
     def moveCursor(self, x, y):
-        self.stdscr.move(y, x)
+        self.cursor = (x, y)
 
     def drawScreen(self, game):
         self.drawBoard(game.board)
@@ -77,19 +134,18 @@ class Display:
         self.redrawRack(game.curPlayer)
     
     def redrawSquare(self, x, y, board, color=None):
-        stdscr = self.stdscr
-        square = board.squares[(x, y)]
+        square = board.square(x, y)
         if color is None:
             color = square.color
         # Mark ordinary empty tiles with a dot
         if square.letter is None and square.bonus == "N":
-            stdscr.addch(y, x, ".", curses.color_pair(color))
+            self.put(x, y, ".", curses.color_pair(color))
         # Leave bonus empty tiles blank
         elif square.letter is None and square.bonus != "N":
-            stdscr.addch(y, x, " ", curses.color_pair(color))
+            self.put(x, y, " ", curses.color_pair(color))
         # Otherwise, mark them with their letter
         else:
-            stdscr.addch(y, x, square.letter, curses.color_pair(color))
+            self.put(x, y, square.letter, curses.color_pair(color))
         
     # Draw the actual Scrabble board
     def drawBoard(self, board):
@@ -100,31 +156,28 @@ class Display:
     # Draw buttons
     def drawButtons(self, game):
         for button in game.buttons:
-            self.stdscr.addstr(button.ystart, button.xstart, button.name, \
+            self.put(button.xstart, button.ystart, button.name, \
                     curses.A_STANDOUT)
 
-    # Print score and whose turn it is
+    # Print score and whose turn it is.  Each line is built in full and
+    # then put on the screen, so only the cells that changed are redrawn.
     def drawStatus(self, game):
-        # Clear score
-        self.stdscr.addstr(SCORE_Y, SCORE_X, " " * (SCRSIZE_X - SCORE_X))
-        self.stdscr.addstr(SCORE_Y + 1, SCORE_X, " " * (SCRSIZE_X - SCORE_X))
-        # Draw score
+        names = ""
+        scores = ""
         for i in range(len(game.players)):
-            self.stdscr.addstr(SCORE_Y, SCORE_X + SCORE_SPC*i,
-                    game.roster[i].name)
-            self.stdscr.addstr(SCORE_Y + 1, SCORE_X + SCORE_SPC*i,
-                    str(game.roster[i].score))
+            names = names.ljust(SCORE_SPC*i) + game.roster[i].name
+            scores = scores.ljust(SCORE_SPC*i) + str(game.roster[i].score)
+        self.put(SCORE_X, SCORE_Y, names.ljust(SCRSIZE_X - SCORE_X))
+        self.put(SCORE_X, SCORE_Y + 1, scores.ljust(SCRSIZE_X - SCORE_X))
         # Draw turn
         if game.curPlayer is not None:
-            self.stdscr.addstr(TURN_Y, TURN_X, " " * (SCRSIZE_X - TURN_X))
-            self.stdscr.addstr(TURN_Y, TURN_X, game.curPlayer.name + "'s turn")
+            self.put(TURN_X, TURN_Y, (game.curPlayer.name + "'s turn").ljust(
+                    SCRSIZE_X - TURN_X))
     
     # Draw bars on screen
     def drawBars(self):
-        for x in range(BAR_H_LENGTH):
-            self.stdscr.addch(BAR_HORIZ, x, " ", curses.A_STANDOUT)
-        for y in range(BAR_V_LENGTH):
-            self.stdscr.addch(BAR_VERT, y, " ", curses.A_STANDOUT)
+        self.put(0, BAR_HORIZ, " " * BAR_H_LENGTH, curses.A_STANDOUT)
+        self.put(0, BAR_VERT, " " * BAR_V_LENGTH, curses.A_STANDOUT)
 
     # Closes the display
     def close(self):
@@ -134,3 +187,52 @@ class Display:
     # Paints the given square a special color.
     def debugColor(self, x, y, board):
         self.redrawSquare(x, y, board, DEBUG)
+
+# A display with no screen.  Input is read one character at a time from a
+# file (standard input by default), so a game can be played from a script
+# of keypresses; at the end of the file, getch returns KEY_EOF.  Messages
+# are recorded in self.messages instead of being shown.
+class HeadlessDisplay(DisplayBase):
+    def __init__(self, game, keys=None):
+        if keys is None:
+            keys = sys.stdin
+        self.keys = keys
+        self.messages = []
+        self.cursor = (0, 0)
+
+    def getch(self):
+        c = self.keys.read(1)
+        if c == "":
+            return KEY_EOF
+        return ord(c)
+
+    def getCursor(self):
+        return self.cursor
+
+    def moveCursor(self, x, y):
+        self.cursor = (x, y)
+
+    def printMsg(self, msg, vertOffset = 0):
+        self.messages.append(msg)
+
+    # Nothing to draw
+    def clearMsg(self, numLines = 0):
+        pass
+
+    def redrawRack(self, player):
+        pass
+
+    def drawScreen(self, game):
+        pass
+
+    def redrawSquare(self, x, y, board, color=None):
+        pass
+
+    def drawStatus(self, game):
+        pass
+
+    def close(self):
+        pass
+
+    def debugColor(self, x, y, board):
+        pass
@@ -0,0 +1,276 @@
+#!/usr/bin/python
+
+# Endgame search.  Once the bag is empty, each player can work out the
+# other's rack from the tiles they can't see, so the rest of a two-player
+# game can be searched exactly, like chess.  The search is negamax with
+# alpha-beta pruning: the value of a position is the spread (points for
+# the player to move minus points for the opponent) from there to the end
+# of the game, including the tiles left on the racks at the end.
+#
+# The search deepens one ply at a time until the time runs out or the
+# whole game has been searched.  Positions at the depth limit are valued
+# by the tiles left on the racks, as if the game ended there.  Moves are
+# tried best first (the best move from the last search of the position,
+# then moves that go out, then by score), which makes the pruning work
+# much better.  Positions already searched are kept in a transposition
+# table keyed by their Zobrist hash (see zobrist.py and Board.hash); the
+# table holds a bounded number of positions and forgets the least recently
+# used.
+#
+# The game ends when a player goes out (they gain the value of the other
+# player's rack, and the other loses it) or when both players pass in a
+# row (each loses the value of their own rack).  After two passes the
+# position is the same as before them, so ending the game there gives the
+# same result as playing out the rest of the scoreless turns.
+
+import time
+from collections import OrderedDict
+import letters
+import MoveGen
+import GameState
+import TileBag
+import zobrist
+
+# Default seconds to search for
+TIME_LIMIT = 1.0
+
+# Deepest search, in plies
+MAX_DEPTH = 20
+
+# Most positions kept in the transposition table
+TABLE_SIZE = 100000
+
+# Depth stored in the transposition table for a position searched right to
+# the end of the game, whose value is good for a search of any depth
+COMPLETE = 1000
+
+# How a value in the transposition table relates to the true value
+EXACT = 0 # It's the true value
+LOWER = 1 # The true value is at least this much
+UPPER = 2 # The true value is at most this much
+
+# The time is checked at every position whose moves are generated, and
+# once every this many positions at the depth limit
+CHECK_EVERY = 32
+
+INFINITY = float("inf")
+
+# Raised inside the search when the time runs out
+class Timeout(Exception):
+    pass
+
+# This class holds the result of a search.
+class Result:
+    def __init__(self, sequence, value, spread, depth, exact, positions):
+        self.sequence = sequence # Moves from here on, None for a pass
+        self.value = value # Spread from here to the end of the game
+        self.spread = spread # Spread at the end of the game
+        self.depth = depth # Plies searched
+        self.exact = exact # True if the whole game was searched
+        self.positions = positions # Positions searched
+
+    # The move to make now, or None to pass
+    def move(self):
+        if len(self.sequence) == 0:
+            return None
+        return self.sequence[0]
+
+    def __repr__(self):
+        return "<Result %s: %+d%s after %d plies>" % (self.sequence,
+                self.spread, self.exact and " (exact)" or "", self.depth)
+
+# Value of the tiles on a rack
+def rackValue(rack):
+    return sum([letters.score[tile] for tile in rack])
+
+# Searches the endgame for the player to move in a game whose bag is empty.
+# Returns a Result.
+def solve(game, player, timeLimit=TIME_LIMIT, maxDepth=MAX_DEPTH):
+    assert len(game.bag) == 0, "Bag isn't empty"
+    assert len(game.roster) == 2, "Endgames are for two players"
+    if game.roster[0] is player:
+        opponent = game.roster[1]
+    else:
+        opponent = game.roster[0]
+    solver = Solver(game.board, [player.rack, opponent.rack], game.lexicon)
+    result = solver.solve(timeLimit, maxDepth, min(game.scoreless, 1))
+    result.spread += player.score - opponent.score
+    return result
+
+# This class searches one endgame.  Players are numbered 0 (to move first)
+# and 1.  Moves are tried and taken back on a GameState, so the board and
+# racks given aren't changed.
+class Solver:
+    def __init__(self, board, racks, lexicon, tableSize=TABLE_SIZE):
+        self.state = GameState.GameState(board, TileBag.TileBag({}), racks,
+                [0, 0])
+        self.racks = self.state.racks
+        self.lexicon = lexicon
+        self.tableSize = tableSize
+        self.table = OrderedDict() # hash -> (depth, value, bound, move)
+        self.positions = 0
+        self.deadline = None
+        self.horizon = False # Set when the search stops at the depth limit
+        self.rootDepth = None # Depth of the search now going on
+        self.rootBest = None # (value, sequence) of the best move so far in it
+
+    # Searches deeper and deeper for up to timeLimit seconds.  passes is
+    # the number of passes just before this turn (0 or 1).  If the time
+    # runs out during the search to one ply, the result is the best of the
+    # moves it has looked at.
+    def solve(self, timeLimit=TIME_LIMIT, maxDepth=MAX_DEPTH, passes=0):
+        key = zobrist.rackHash(self.racks[0], 0) ^ \
+                zobrist.rackHash(self.racks[1], 1) ^ \
+                zobrist.turnKeys[0] ^ zobrist.scorelessKeys[passes]
+        self.deadline = time.time() + timeLimit
+        result = None
+        for depth in range(1, maxDepth + 1):
+            self.horizon = False
+            self.rootDepth = depth
+            self.rootBest = None
+            try:
+                value, sequence = self.search(key, 0, passes, depth,
+                        -INFINITY, INFINITY)
+            except Timeout:
+                if result is None:
+                    result = self.partialResult()
+                break
+            result = Result(sequence, value, value, depth, not self.horizon,
+                    self.positions)
+            if result.exact:
+                break
+        result.positions = self.positions
+        return result
+
+    # Returns a Result for a search to one ply that ran out of time: the
+    # best move it looked at, or if it didn't finish looking at any, the
+    # first it would have tried
+    def partialResult(self):
+        if self.rootBest is not None:
+            value, sequence = self.rootBest
+        else:
+            value = 0
+            sequence = self.orderMoves(self.racks[0], None)[:1]
+        return Result(sequence, value, value, 0, False, self.positions)
+
+    # Returns (value, sequence) for the position on the board, with player
+    # to move and passes passes just made, searching depth plies.  If the
+    # value is at most alpha or at least beta, it need only be a bound.
+    # racksKey is the hash of everything but the board (the racks, the
+    # player to move and the passes); the board keeps its own hash.
+    def search(self, racksKey, player, passes, depth, alpha, beta):
+        self.positions += 1
+        if self.deadline is not None and \
+                (depth > 0 or self.positions % CHECK_EVERY == 0) and \
+                time.time() > self.deadline:
+            raise Timeout()
+        rack = self.racks[player]
+        otherRack = self.racks[1 - player]
+        if passes >= 2:
+            return rackValue(otherRack) - rackValue(rack), []
+        if depth == 0:
+            self.horizon = True
+            return rackValue(otherRack) - rackValue(rack), []
+
+        key = racksKey ^ self.state.board.hash
+        bestFirst = None
+        entry = self.table.pop(key, None)
+        if entry is not None:
+            self.table[key] = entry # Most recently used goes last
+            entryDepth, value, bound, bestFirst = entry
+            if entryDepth >= depth:
+                if bound == EXACT or \
+                        (bound == LOWER and value >= beta) or \
+                        (bound == UPPER and value <= alpha):
+                    if entryDepth != COMPLETE:
+                        self.horizon = True
+                    return value, [bestFirst]
+
+        # Find out whether this position's search stops at the depth limit
+        outerHorizon = self.horizon
+        self.horizon = False
+        originalAlpha = alpha
+        best = -INFINITY
+        bestSequence = []
+        otherValue = rackValue(otherRack)
+        turnKey = zobrist.turnKeys[player] ^ zobrist.turnKeys[1 - player]
+        for move in self.orderMoves(rack, bestFirst):
+            if move is None:
+                self.state.apply(None)
+                try:
+                    value, sequence = self.search(racksKey ^ turnKey ^
+                            zobrist.scorelessKeys[passes] ^
+                            zobrist.scorelessKeys[passes + 1],
+                            1 - player, passes + 1, depth - 1, -beta, -alpha)
+                finally:
+                    self.state.undo()
+                value = -value
+            elif len(move.tiles) == len(rack):
+                # Going out ends the game
+                value = move.score + 2 * otherValue
+                sequence = []
+            else:
+                childKey = racksKey ^ turnKey ^ self.play(move, player) ^ \
+                        zobrist.scorelessKeys[passes] ^ \
+                        zobrist.scorelessKeys[0]
+                try:
+                    value, sequence = self.search(childKey, 1 - player, 0,
+                            depth - 1, move.score - beta, move.score - alpha)
+                finally:
+                    self.state.undo()
+                value = move.score - value
+            if value > best:
+                best = value
+                bestSequence = [move] + sequence
+                if depth == self.rootDepth:
+                    self.rootBest = (best, bestSequence)
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                break
+
+        if best <= originalAlpha:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        if not self.horizon:
+            depth = COMPLETE
+        self.horizon = self.horizon or outerHorizon
+        self.store(key, (depth, best, bound, bestSequence[0]))
+        return best, bestSequence
+
+    # Returns the moves for a rack, best guesses first, ending with a pass
+    # (None).  bestFirst is a move to try first, if there is one.
+    def orderMoves(self, rack, bestFirst):
+        moves = list(MoveGen.generateMoves(self.state.board, rack,
+                self.lexicon))
+        size = len(rack)
+        moves.sort(key=lambda move: (len(move.tiles) != size, -move.score))
+        if bestFirst is not None:
+            for i in range(len(moves)):
+                if moves[i].tiles == bestFirst.tiles:
+                    moves.insert(0, moves.pop(i))
+                    break
+        moves.append(None)
+        return moves
+
+    # Makes a move for a player, who must be the one to move.  Returns the
+    # change to the racks' hash.  The move is taken back with
+    # self.state.undo().
+    def play(self, move, player):
+        rack = self.racks[player]
+        before = zobrist.rackHash(rack, player)
+        self.state.apply(move, False)
+        return before ^ zobrist.rackHash(rack, player)
+
+    # Adds a position to the transposition table, forgetting the least
+    # recently used one if it's full
+    def store(self, key, entry):
+        table = self.table
+        if key in table:
+            del table[key]
+        elif len(table) >= self.tableSize:
+            table.popitem(last=False)
+        table[key] = entry
@@ -3,34 +3,65 @@
 import random
 import sys
 from collections import deque
+from array import array
 import letters
 import Player
+import AIPlayer
 import Play
 import Button
 import Display
+import Lexicon
+import TileBag
+import Leaves
+import zobrist
+import GameState
+import History
 from bonus import *
+from Lexicon import ALL_LETTERS
+
+# Set this to check the board's cross-check tables after every change
+CHECK_CROSS_CHECKS = False
+
+# Bits for every square in a row of a bitboard
+ROW_BITS = (1 << BOARDSIZE_X) - 1
 
 #### These classes represent the game and board.
 
 # This class represents a Scrabble game.
 class Game:
-    def __init__(self, intl, challenge):
+    # If headless is true, the game runs without a screen (see
+    # Display.HeadlessDisplay).  If names is given, it is the list of
+    # players' names, and the player isn't asked for them; the last
+    # computers of them are computer players.  seed seeds the tile bag, so
+    # the same seed draws the same tiles.
+    def __init__(self, intl, challenge, headless=False, names=None,
+            seed=None, computers=0):
         self.players = deque() # Rotating queue of players
         self.roster = [] # Static list of players (used for screen display)
         self.curPlayer = None
         self.plays = []
         self.gameOver = False
+        self.finished = False # True once the game has been played out
         self.challenge = challenge
-        self.board = Board() # Create board
+        self.scoreless = 0 # Turns in a row in which nobody scored
+        self.turnNumber = 0 # Game turns so far (see Player.newTurn)
+        self.journal = None # Journal the game is recorded in, if any
 
         # Choose dictionary
         if intl is True:
             self.dictionary = "sowpods.txt"
         else:
             self.dictionary = "TWL06.txt"
+        # Load the word list once; every play checks words against it
+        self.lexicon = Lexicon.Lexicon(self.dictionary)
+        # Leave values for computer players, if they've been built (see
+        # buildleaves.py)
+        self.leaves = Leaves.load(self.dictionary)
+
+        self.board = Board(self.lexicon) # Create board
 
         # Add players to game
-        self.addPlayers()
+        self.addPlayers(names, computers)
         
         # Buttons on board
         self.passButton = Button.PassButton()
@@ -39,33 +70,32 @@ class Game:
         self.challengeButton = Button.ChallengeButton(self.challenge)
         self.shuffleButton = Button.ShuffleButton()
         self.submitButton = Button.SubmitButton()
+        self.hintButton = Button.HintButton()
+        self.undoButton = Button.UndoButton()
         self.buttons = [self.passButton, self.recallButton, self.quitButton, \
-                self.challengeButton, self.shuffleButton, self.submitButton]
+                self.challengeButton, self.shuffleButton, self.submitButton, \
+                self.hintButton, self.undoButton]
 
-        self.display = Display.Display(self) # Create display
+        # Create display
+        if headless:
+            self.display = Display.HeadlessDisplay(self)
+        else:
+            self.display = Display.Display(self)
 
         # Fill bag with tiles
-        self.bag = []
-        for letter in letters.frequency.keys():
-            # letters.frequency[letter] is the number of tiles
-            # there should be in the bag of a certain type.
-            for i in range(letters.frequency[letter]):
-                self.bag.append(letter)
+        self.bag = TileBag.TileBag(letters.frequency, seed)
+
+        # Undo and redo stacks of the turns played
+        self.history = History.History(self)
     
     def startGame(self):
-        random.seed() # For choosing tiles randomly, and shuffling
+        random.seed() # For shuffling (the bag has its own generator)
         # Draw the display
         self.display.drawScreen(self)
         
         # Enter game loop
         while self.gameOver == False:
-            # Choose a player to play
-            player = self.players.popleft()
-            self.players.append(player)
-            self.curPlayer = player
-
-            # Ask the player to take his turn
-            player.takeTurn(self)
+            self.playTurn()
         
         # End of game
         self.display.close()
@@ -74,8 +104,38 @@ class Game:
             print player.name, "scored", player.score, "points"
         print "Everyone did fantastic!\n"
     
-    # Add players to game
-    def addPlayers(self):
+    # Lets the next player take a turn, and returns that player
+    def playTurn(self):
+        # Choose a player to play
+        player = self.players.popleft()
+        self.players.append(player)
+        self.curPlayer = player
+        self.turnNumber += 1
+
+        # Ask the player to take his turn, unless the last play went out
+        # and all that's left is to challenge it or not
+        outPlayer = self.playerOut()
+        if outPlayer is not None:
+            self.answerOut(player, outPlayer)
+        else:
+            player.takeTurn(self)
+        # A player who quits in the middle of their turn still has it to
+        # take when the game is resumed
+        if self.gameOver and not self.finished:
+            self.repeatTurn()
+        self.history.endTurn()
+        if self.journal is not None:
+            self.journal.endTurn()
+        return player
+
+    # Add players to game.  The last computers players are computer
+    # players.
+    def addPlayers(self, names=None, computers=0):
+        if names is not None:
+            for i in range(len(names)):
+                self.addPlayer(names[i], i >= len(names) - computers)
+            self.roster = list(self.players)
+            return
         print "\nWelcome to terminal Scrabble!  Using dictionary " + self.dictionary
         try:
             numPlayers = int(raw_input("Please enter the number of players. "))
@@ -83,16 +143,131 @@ class Game:
                 sys.exit("Scrabble is a game for 2-4 people\n")
         except:
             sys.exit("Must enter a number between 2 and 4\n")
-        for i in range(numPlayers):
+        try:
+            answer = raw_input("How many of them are computer players? " + \
+                    "(default 0) ")
+            computers = int(answer or "0")
+            if computers < 0 or computers > numPlayers:
+                raise ValueError()
+        except ValueError:
+            sys.exit("Must enter a number between 0 and " + str(numPlayers) + "\n")
+        for i in range(numPlayers - computers):
             name = raw_input("Enter name of player " + str(i+1) + ": ")
             # Names cannot be too short or too long
             if len(name) < 1 or len(name) > 8:
                 name = "Player " + str(i+1)
-            self.players.append(Player.Player(self, name))
+            self.addPlayer(name, False)
+        for i in range(computers):
+            self.addPlayer("CPU " + str(i+1), True)
         self.roster = list(self.players)
 
+    def addPlayer(self, name, computer):
+        if computer:
+            if self.leaves is not None:
+                evaluate = Leaves.evaluation(self.leaves)
+            else:
+                evaluate = AIPlayer.scoreEvaluation
+            self.players.append(AIPlayer.AIPlayer(self, name, evaluate))
+        else:
+            self.players.append(Player.Player(self, name))
+
     def endGame(self):
         self.gameOver = True
+
+    # Returns a GameState of the game as it stands, for looking ahead
+    # without changing the game.  player is the player to move (the current
+    # player, by default).  The state shares the board and bag with the
+    # game until it changes them, so the game mustn't change while the
+    # state is in use.
+    def snapshot(self, player=None):
+        if player is None:
+            player = self.curPlayer or self.players[0]
+        return GameState.GameState(self.board, self.bag,
+                [other.rack for other in self.roster],
+                [other.score for other in self.roster],
+                self.roster.index(player), self.scoreless)
+
+    # Returns a 64-bit hash of the position as a player sees it on their
+    # turn: the tiles on the board, the player's rack and whose turn it is
+    # (the current player's, by default).  Positions that hash the same are
+    # almost certainly the same.
+    def stateHash(self, player=None):
+        if player is None:
+            player = self.curPlayer or self.players[0]
+        return self.board.hash ^ player.rackHash ^ \
+                zobrist.turnKeys[self.roster.index(player)]
+
+    # Counts a pass or exchange.  The game ends after three turns in a row
+    # per player without a score.
+    def scorelessTurn(self):
+        if self.journal is not None:
+            self.journal.scoreless()
+        self.scoreless += 1
+        if self.scoreless >= 3 * len(self.roster):
+            self.finishGame()
+
+    # Ends a game that was played out.  Each player loses the value of the
+    # tiles left on their rack, and whoever went out (if anyone) gains the
+    # total.
+    def finishGame(self, outPlayer=None):
+        for player in self.roster:
+            penalty = sum([letters.score[tile] for tile in player.rack])
+            player.score -= penalty
+            if outPlayer is not None:
+                outPlayer.score += penalty
+        self.finished = True
+        self.endGame()
+
+    # Puts a submitted play on the record: the player scores it, and the
+    # game is over if it used their last tile after the bag ran out
+    def scorePlay(self, play):
+        if self.journal is not None:
+            self.journal.play(play)
+        player = play.player
+        self.plays.append(play)
+        player.score += play.score
+        player.newTurn = True
+        self.scoreless = 0
+        # With challenges on, the game waits for the next player to decide
+        # whether to challenge (see answerOut)
+        if len(self.bag) == 0 and len(player.rack) == 0 and \
+                not self.challenge:
+            self.finishGame(player)
+
+    # Returns the player who used their last tile after the bag ran out,
+    # if the game is waiting to see whether that play is challenged, or
+    # None
+    def playerOut(self):
+        if not self.challenge or self.finished or len(self.bag) > 0:
+            return None
+        for player in self.roster:
+            if len(player.rack) == 0:
+                return player
+        return None
+
+    # Lets the player after one who went out challenge the play that did
+    # it.  If they don't, or the play stands, the game is over.
+    def answerOut(self, player, outPlayer):
+        player.canChallenge = True
+        if player.wantsChallenge(self, outPlayer):
+            self.challengeButton.click(self, player)
+        if len(outPlayer.rack) == 0:
+            if self.journal is not None:
+                self.journal.finish(outPlayer)
+            self.finishGame(outPlayer)
+
+    # Takes the last play off the board after a successful challenge,
+    # returning its tiles to the player's rack and taking back its score.
+    # Returns the play.
+    def withdrawPlay(self):
+        if self.journal is not None:
+            self.journal.withdraw()
+        play = self.plays.pop()
+        play.player.score -= play.score
+        for square in play.squares:
+            play.player.putOnRack(letters.tileFor(square.letter))
+            self.board.changeLetter(square.x, square.y, None)
+        return play
     
     # Go backwards in the turn order (allows person to take another turn
     # if called once; goes to the previous person if called twice)
@@ -106,22 +281,79 @@ class Game:
         sys.exit("Debug: " + error)
 
 # This class represents a Scrabble board.
+#
+# The letters on the board are kept in a flat bytearray indexed by y*15+x
+# (0 for an empty square), and the bonus of each square is looked up in
+# squareBonus (see bonus.py), which is shared by every board.  A Square is
+# a small view of one position on the board, made on demand for code that
+# wants an object (see square()).
+#
+# The board also keeps cross-check tables for the move generator.  For each
+# direction a word can run in (ACROSS or DOWN) and each empty square, they
+# hold:
+#   crossChecks - mask of the letters that can go on the square (see
+#                 Lexicon.crossCheck), given the tiles next to it in the
+#                 other direction
+#   crossSums   - total score of those tiles, or -1 if there are none
+#   crossParts  - (before, after) strings of those tiles, or None
+# They are brought up to date by changeLetter, which only has to look at
+# the squares at either end of the row and column through the new tile.
+#
+# Occupancy is also kept as bitboards: rowBits[y] has bit x set if (x, y)
+# holds a tile, and colBits[x] has bit y set.  anchorBits[y] has bit x set
+# if (x, y) is an empty square next to a tile (an "anchor," see MoveGen).
+#
+# hash is the Zobrist hash of the tiles on the board (see zobrist.py), also
+# kept up to date by changeLetter.
 class Board:
-    def __init__(self):
-        # Add squares to the board
-        self.squares = {}
-        for x in range(BOARDSIZE_X):
-            for y in range(BOARDSIZE_Y):
-                letter = None
-                self.squares[(x, y)] = Square(x, y, letter)
+    def __init__(self, lexicon, copyFrom=None):
+        self.lexicon = lexicon
+        if copyFrom is not None:
+            self.letters = bytearray(copyFrom.letters)
+            self.rowBits = list(copyFrom.rowBits)
+            self.colBits = list(copyFrom.colBits)
+            self.anchorBits = list(copyFrom.anchorBits)
+            self.crossChecks = [array('i', table)
+                    for table in copyFrom.crossChecks]
+            self.crossSums = [array('h', table)
+                    for table in copyFrom.crossSums]
+            self.crossParts = [list(table) for table in copyFrom.crossParts]
+            self.hash = copyFrom.hash
+            return
+        numSquares = BOARDSIZE_X * BOARDSIZE_Y
+        self.letters = bytearray(numSquares)
+        self.rowBits = [0] * BOARDSIZE_Y
+        self.colBits = [0] * BOARDSIZE_X
+        self.anchorBits = [0] * BOARDSIZE_Y
+        self.crossChecks = [array('i', [ALL_LETTERS] * numSquares),
+                array('i', [ALL_LETTERS] * numSquares)]
+        self.crossSums = [array('h', [-1] * numSquares),
+                array('h', [-1] * numSquares)]
+        self.crossParts = [[None] * numSquares, [None] * numSquares]
+        self.hash = 0 # Zobrist hash of the tiles on the board
+
+    # Returns an independent copy of the board
+    def copy(self):
+        return Board(self.lexicon, self)
 
     def changeLetter(self, x, y, letter):
-        square = self.squares[(x, y)]
-        square.letter = letter
+        i = y * BOARDSIZE_X + x
+        if self.letters[i]:
+            self.hash ^= zobrist.squareKeys[i][chr(self.letters[i])]
         if letter is None:
-            square.color = colors[bonuses[(x, y)]]
+            self.letters[i] = 0
+            self.rowBits[y] &= ~(1 << x)
+            self.colBits[x] &= ~(1 << y)
         else:
-            square.color = BKGROUND
+            self.letters[i] = ord(letter)
+            self.hash ^= zobrist.squareKeys[i][letter]
+            self.rowBits[y] |= 1 << x
+            self.colBits[x] |= 1 << y
+        for row in range(max(y - 1, 0), min(y + 2, BOARDSIZE_Y)):
+            self.updateAnchors(row)
+        self.updateCrossChecks(x, y)
+        if CHECK_CROSS_CHECKS:
+            self.checkCrossChecks()
     
     def onBoard(self, x, y):
         if x in range(BOARDSTART_X, BOARDSTART_X + BOARDSIZE_X):
@@ -129,19 +361,184 @@ class Board:
                 return True
         return False
 
-class Square:
-    def __init__(self, x, y, letter):
-        self.bonus = bonuses[(x, y)] # "DL", "DW", "TL", "TW", "N"
-        self.color = colors[self.bonus]
-        self.letter = letter
+    # Returns a view of the square at (x, y)
+    def square(self, x, y):
+        return Square(self, x, y)
+
+    def letterAt(self, x, y):
+        return letterOf[self.letters[y * BOARDSIZE_X + x]]
+
+    # Returns a list of the letters on the board, indexed by y*15+x, with
+    # None for empty squares
+    def cells(self):
+        return [letterOf[code] for code in self.letters]
+
+    # Returns views of every occupied square
+    def occupiedSquares(self):
+        squares = []
+        for i in range(len(self.letters)):
+            if self.letters[i]:
+                squares.append(Square(self, i % BOARDSIZE_X, i / BOARDSIZE_X))
+        return squares
+
+    def isEmpty(self):
+        return not any(self.rowBits)
+
+    # Recomputes the anchors in a row: empty squares with a tile beside,
+    # above or below them
+    def updateAnchors(self, y):
+        tiles = self.rowBits[y]
+        around = (tiles << 1) | (tiles >> 1)
+        if y > 0:
+            around |= self.rowBits[y - 1]
+        if y < BOARDSIZE_Y - 1:
+            around |= self.rowBits[y + 1]
+        self.anchorBits[y] = around & ~tiles & ROW_BITS
+
+    def isAnchor(self, x, y):
+        return (self.anchorBits[y] >> x) & 1 == 1
+
+    # Checks to see if the squares from x1 to x2 (inclusive) in every row
+    # from y1 to y2 are all occupied
+    def isFilled(self, x1, y1, x2, y2):
+        if x1 == x2:
+            span = ((1 << (y2 - y1 + 1)) - 1) << y1
+            return self.colBits[x1] & span == span
+        span = ((1 << (x2 - x1 + 1)) - 1) << x1
+        for y in range(y1, y2 + 1):
+            if self.rowBits[y] & span != span:
+                return False
+        return True
+
+    # Updates the cross-checks changed by a tile going onto or coming off
+    # (x, y): the square itself and the first empty square past the tiles
+    # on each side of it.  Across moves are checked against the column,
+    # and down moves against the row.
+    def updateCrossChecks(self, x, y):
+        self.updateCrossCheck(x, y, ACROSS)
+        self.updateCrossCheck(x, y, DOWN)
+        for dx, dy, direction in ((0, 1, ACROSS), (1, 0, DOWN)):
+            for step in (-1, 1):
+                i = x + dx * step
+                j = y + dy * step
+                while self.inBounds(i, j) and self.letterAt(i, j) is not None:
+                    i += dx * step
+                    j += dy * step
+                if self.inBounds(i, j):
+                    self.updateCrossCheck(i, j, direction)
+
+    # Recomputes the cross-check of one square for moves in a direction
+    def updateCrossCheck(self, x, y, direction):
+        i = y * BOARDSIZE_X + x
+        parts = None
+        if self.letterAt(x, y) is None:
+            if direction == ACROSS:
+                parts = self.lettersBeside(x, y, 0, 1)
+            else:
+                parts = self.lettersBeside(x, y, 1, 0)
+            if parts == ("", ""):
+                parts = None
+        if parts is None:
+            self.crossChecks[direction][i] = ALL_LETTERS
+            self.crossSums[direction][i] = -1
+        else:
+            self.crossChecks[direction][i] = self.lexicon.crossCheck(
+                    parts[0].upper(), parts[1].upper())
+            self.crossSums[direction][i] = \
+                    wordScore(parts[0]) + wordScore(parts[1])
+        self.crossParts[direction][i] = parts
+
+    # Returns the strings of tiles directly before and after (x, y) in the
+    # direction (dx, dy)
+    def lettersBeside(self, x, y, dx, dy):
+        before = ""
+        i, j = x - dx, y - dy
+        while self.inBounds(i, j) and self.letterAt(i, j) is not None:
+            before = self.letterAt(i, j) + before
+            i, j = i - dx, j - dy
+        after = ""
+        i, j = x + dx, y + dy
+        while self.inBounds(i, j) and self.letterAt(i, j) is not None:
+            after += self.letterAt(i, j)
+            i, j = i + dx, j + dy
+        return before, after
+
+    # Checks to see if board coordinates (not screen coordinates) are in
+    # range
+    def inBounds(self, x, y):
+        return 0 <= x < BOARDSIZE_X and 0 <= y < BOARDSIZE_Y
+
+    # Checks the cross-check tables against ones worked out from scratch.
+    # This is slow; it is only run after every change if CHECK_CROSS_CHECKS
+    # is turned on.
+    def checkCrossChecks(self):
+        tables = (self.crossChecks, self.crossSums, self.crossParts)
+        saved = [[table[ACROSS][:], table[DOWN][:]] for table in tables]
+        for x in range(BOARDSIZE_X):
+            for y in range(BOARDSIZE_Y):
+                self.updateCrossCheck(x, y, ACROSS)
+                self.updateCrossCheck(x, y, DOWN)
+        for table, old in zip(tables, saved):
+            for direction in (ACROSS, DOWN):
+                for i in range(len(old[direction])):
+                    assert table[direction][i] == old[direction][i], \
+                            "Cross-check tables out of date at (%d, %d)" % \
+                            (i % BOARDSIZE_X, i / BOARDSIZE_X)
+
+# Total score of some tiles already on the board
+def wordScore(word):
+    total = 0
+    for letter in word:
+        total += letters.score[letter]
+    return total
+
+# Letter for each value in Board.letters
+letterOf = [None] + [chr(code) for code in range(1, 256)]
+
+# This class is a view of one square on a board.  It holds no state of its
+# own, so two views of the same square compare equal.
+class Square(object):
+    __slots__ = ("board", "x", "y")
+
+    def __init__(self, board, x, y):
+        self.board = board
         self.x = x
         self.y = y
-    
+
+    # The letter on the square, or None
+    @property
+    def letter(self):
+        return letterOf[self.board.letters[self.y * BOARDSIZE_X + self.x]]
+
+    # "DL", "DW", "TL", "TW", "N"
+    @property
+    def bonus(self):
+        return squareBonus[self.y * BOARDSIZE_X + self.x]
+
+    @property
+    def color(self):
+        if self.isOccupied():
+            return BKGROUND
+        return colors[self.bonus]
+
     def isOccupied(self):
-        if self.letter is not None:
+        if self.board.letters[self.y * BOARDSIZE_X + self.x]:
             return True
         else:
             return False
+
+    def __eq__(self, other):
+        return isinstance(other, Square) and self.board is other.board and \
+                self.x == other.x and self.y == other.y
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.x, self.y))
+
+    def __repr__(self):
+        return "<Square (%d, %d) %s>" % (self.x, self.y, self.letter)
     
     # Checks to see if the square is connected to any square in a list of
     # other squares.
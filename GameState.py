@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+# This class represents the position in a game: the board, the bag, each
+# player's rack and score, whose turn it is and how many turns in a row
+# have gone by without a score.  It is for code that looks ahead (search,
+# simulation, the computer players), which has to try moves and take them
+# back over and over without touching the game on the screen.
+#
+# apply() makes a move and undo() takes back the last one.  Neither copies
+# anything: each move records only what it changed (its tiles, the tiles
+# drawn to replace them, and the scoreless count before it), and undo()
+# puts those back.
+#
+# fork() makes an independent copy of a state.  The board and the bag are
+# copied on write: the copy shares them with the original, and whichever
+# of the two changes them first makes its own copy then.  So forking costs
+# about as much as copying the racks and scores, and a fork that is only
+# looked at never copies the board at all.  Taking back a move made before
+# a fork isn't possible in the fork.
+#
+# A Game hands out states with snapshot(); the game itself is never changed
+# through them.
+
+import zobrist
+from letters import tileFor
+
+class GameState:
+    # board and bag are shared (not copied) until the state changes them.
+    # racks is a list of each player's rack, and scores their scores.
+    def __init__(self, board, bag, racks, scores, toMove=0, scoreless=0):
+        self.board = board
+        self.bag = bag
+        self.racks = [list(rack) for rack in racks]
+        self.scores = list(scores)
+        self.toMove = toMove # Number of the player to move
+        self.scoreless = scoreless # Turns in a row without a score
+        self.history = [] # (move, drawn, exchanged, scoreless) for each turn
+        self.ownsBoard = False # True once the board is this state's own
+        self.ownsBag = False
+
+    # Returns an independent copy of the state, sharing the board and bag
+    # until one of them changes
+    def fork(self):
+        state = GameState(self.board, self.bag, self.racks, self.scores,
+                self.toMove, self.scoreless)
+        self.ownsBoard = False
+        self.ownsBag = False
+        return state
+
+    # The rack of the player to move
+    def rack(self):
+        return self.racks[self.toMove]
+
+    # Makes a move (a MoveGen.Move, or None to pass) for the player to
+    # move.  If draw is true, the player then draws back up to 7 tiles.
+    def apply(self, move, draw=True):
+        rack = self.racks[self.toMove]
+        drawn = []
+        self.history.append((move, drawn, None, self.scoreless))
+        if move is None:
+            self.scoreless += 1
+        else:
+            board = self.boardToChange()
+            for x, y, letter in move.tiles:
+                board.changeLetter(x, y, letter)
+                rack.remove(tileFor(letter))
+            self.scores[self.toMove] += move.score
+            if move.score > 0:
+                self.scoreless = 0
+            else:
+                self.scoreless += 1
+            if draw and len(self.bag) > 0:
+                drawn.extend(self.bagToChange().drawTiles(7 - len(rack)))
+                rack.extend(drawn)
+        self.toMove = (self.toMove + 1) % len(self.racks)
+
+    # Swaps tiles from the rack of the player to move with the bag
+    def exchange(self, tiles):
+        rack = self.racks[self.toMove]
+        bag = self.bagToChange()
+        for tile in tiles:
+            rack.remove(tile)
+        drawn = bag.drawTiles(len(tiles))
+        rack.extend(drawn)
+        bag.addTiles(tiles)
+        self.history.append((None, drawn, list(tiles), self.scoreless))
+        self.scoreless += 1
+        self.toMove = (self.toMove + 1) % len(self.racks)
+
+    # Takes back the last move or exchange
+    def undo(self):
+        move, drawn, exchanged, scoreless = self.history.pop()
+        self.toMove = (self.toMove - 1) % len(self.racks)
+        self.scoreless = scoreless
+        rack = self.racks[self.toMove]
+        # The tiles exchanged went back in the bag whether or not any were
+        # drawn for them
+        if exchanged:
+            bag = self.bagToChange()
+            for tile in exchanged:
+                bag.remove(tile)
+            rack.extend(exchanged)
+        if drawn:
+            for tile in drawn:
+                rack.remove(tile)
+            self.bagToChange().addTiles(drawn)
+        if move is not None:
+            board = self.boardToChange()
+            for x, y, letter in move.tiles:
+                board.changeLetter(x, y, None)
+                rack.append(tileFor(letter))
+            self.scores[self.toMove] -= move.score
+
+    # Returns the board, copying it first if it's shared
+    def boardToChange(self):
+        if not self.ownsBoard:
+            self.board = self.board.copy()
+            self.ownsBoard = True
+        return self.board
+
+    def bagToChange(self):
+        if not self.ownsBag:
+            self.bag = self.bag.copy()
+            self.ownsBag = True
+        return self.bag
+
+    # Checks to see if the game is over: someone has gone out, or there
+    # have been three turns in a row per player without a score
+    def isOver(self):
+        if self.scoreless >= 3 * len(self.racks):
+            return True
+        if len(self.bag) > 0:
+            return False
+        for rack in self.racks:
+            if len(rack) == 0:
+                return True
+        return False
+
+    # Returns a 64-bit hash of the position as the player to move sees it
+    # (see Game.stateHash)
+    def hash(self):
+        return self.board.hash ^ \
+                zobrist.rackHash(self.racks[self.toMove], 0) ^ \
+                zobrist.turnKeys[self.toMove]
@@ -0,0 +1,276 @@
+#!/usr/bin/python
+
+# This class keeps the undo and redo stacks of a game.  At the end of each
+# turn that changed the game, it pushes a Delta: a record of only what the
+# turn changed (the squares it put tiles on or took them off, the tiles
+# that went onto and off each rack, the tiles drawn from and put back in
+# the bag, the plays added and withdrawn, the change in each score), whose
+# turn it was before and after, and the state of the bag's random number
+# generator before and after, so a turn that is taken back and played
+# again draws the same tiles.  Undoing or redoing a turn goes
+# through its record alone, so it takes time in proportion to the tiles
+# the turn moved, however far into the game it is.
+#
+# The changes are found by comparing the game at the end of the turn with
+# how it was at the end of the last one, so nothing else in the game has
+# to report them, and penalties at the end of the game are caught too.
+# A turn ends when play passes to someone else.  Buttons that give the
+# player another go (shuffling, recalling, asking for a hint, a successful
+# challenge) don't end it, so tiles still being placed are never recorded
+# on their own; everything the player does goes in one record when the
+# turn ends.  Turns that changed nothing but whose turn it is aren't
+# recorded.
+#
+# undo() and redo() step one record at a time, which is how analysis tools
+# can walk back and forth through a game.  undoTurnOf() is for the UNDO
+# button: it takes back the player's own last turn, and every turn since.
+
+from collections import Counter, deque
+from constants import BOARDSIZE_X
+from TileBag import SLOTS, slotOf
+
+# The game as it was at the end of a turn
+class Position:
+    def __init__(self, game):
+        self.letters = bytearray(game.board.letters)
+        self.racks = [Counter(player.rack) for player in game.roster]
+        self.bag = list(game.bag.counts)
+        self.scores = [player.score for player in game.roster]
+        self.plays = list(game.plays)
+        self.turn = turnOf(game)
+        self.random = game.bag.rng.getstate()
+
+    # Brings the position up to date with a record applied (direction 1)
+    # or reversed (-1), without looking at the rest of the game
+    def follow(self, delta, direction):
+        for i, old, new in delta.squares:
+            if direction < 0:
+                new = old
+            self.letters[i] = new and ord(new) or 0
+        for number, off, on in delta.racks:
+            if direction < 0:
+                off, on = on, off
+            self.racks[number].subtract(off)
+            self.racks[number].update(on)
+            self.racks[number] += Counter() # Drop tiles counted as 0
+        for tile in delta.drawn:
+            self.bag[slotOf[tile]] -= direction
+        for tile in delta.returned:
+            self.bag[slotOf[tile]] += direction
+        for number, change in delta.scores:
+            self.scores[number] += change * direction
+        removed, added = delta.withdrawn, delta.added
+        if direction < 0:
+            removed, added = added, removed
+        if removed:
+            del self.plays[-len(removed):]
+        self.plays.extend(added)
+        if direction < 0:
+            self.turn = delta.before
+            self.random = delta.randomBefore
+        else:
+            self.turn = delta.after
+            self.random = delta.randomAfter
+
+# Whose turn it is: the order of play, whether each player is starting a
+# new turn and may challenge, the turn number, turns without a score, and
+# whether the game has been played out
+def turnOf(game):
+    roster = game.roster
+    return (tuple([roster.index(player) for player in game.players]),
+            tuple([player.newTurn for player in roster]),
+            tuple([player.canChallenge for player in roster]),
+            game.turnNumber, game.scoreless, game.finished)
+
+def setTurn(game, turn):
+    order, fresh, challenges, game.turnNumber, game.scoreless, \
+            game.finished = turn
+    roster = game.roster
+    game.players = deque([roster[number] for number in order])
+    for player, newTurn, canChallenge in zip(roster, fresh, challenges):
+        player.newTurn = newTurn
+        player.canChallenge = canChallenge
+    game.gameOver = game.finished
+
+# What one turn changed.  Players are given by their number in the roster.
+class Delta(object):
+    __slots__ = ("mover", # The player whose turn it was
+            "squares", # (index on the board, letter before, letter after)
+            "racks", # (player, tiles taken off, tiles put on)
+            "drawn", # Tiles taken out of the bag
+            "returned", # Tiles put back in the bag
+            "scores", # (player, change in score)
+            "withdrawn", # Plays taken off game.plays
+            "added", # Plays put on game.plays
+            "before", "after", # Whose turn it was (see turnOf)
+            "randomBefore", "randomAfter") # State of the bag's generator
+
+    # Makes the changes of the turn
+    def apply(self, game):
+        board = game.board
+        for i, old, new in self.squares:
+            board.changeLetter(i % BOARDSIZE_X, i / BOARDSIZE_X, new)
+        self.moveTiles(game, 1)
+        if self.withdrawn:
+            del game.plays[-len(self.withdrawn):]
+        game.plays.extend(self.added)
+        setTurn(game, self.after)
+        game.bag.rng.setstate(self.randomAfter)
+
+    # Takes back the changes of the turn
+    def reverse(self, game):
+        board = game.board
+        for i, old, new in self.squares:
+            board.changeLetter(i % BOARDSIZE_X, i / BOARDSIZE_X, old)
+        self.moveTiles(game, -1)
+        if self.added:
+            del game.plays[-len(self.added):]
+        game.plays.extend(self.withdrawn)
+        setTurn(game, self.before)
+        game.bag.rng.setstate(self.randomBefore)
+
+    # Moves the tiles between the racks and the bag and changes the
+    # scores, forwards (direction 1) or backwards (-1)
+    def moveTiles(self, game, direction):
+        roster = game.roster
+        bag = game.bag
+        for number, off, on in self.racks:
+            if direction < 0:
+                off, on = on, off
+            for tile in off:
+                roster[number].takeOffRack(tile)
+            for tile in on:
+                roster[number].putOnRack(tile)
+        drawn, returned = self.drawn, self.returned
+        if direction < 0:
+            drawn, returned = returned, drawn
+        for tile in drawn:
+            bag.remove(tile)
+        bag.addTiles(returned)
+        for number, change in self.scores:
+            roster[number].score += change * direction
+
+    # True if the turn changed nothing but whose turn it is
+    def isEmpty(self):
+        return not (self.squares or self.racks or self.drawn or
+                self.returned or self.scores or self.withdrawn or
+                self.added or self.before[4:] != self.after[4:])
+
+# Returns the Delta that takes the game from position old to how it is now
+def difference(game, old, mover):
+    delta = Delta()
+    delta.mover = mover
+    letters = game.board.letters
+    delta.squares = []
+    if letters != old.letters:
+        for i in range(len(letters)):
+            if letters[i] != old.letters[i]:
+                delta.squares.append((i, old.letters[i] and
+                        chr(old.letters[i]) or None,
+                        letters[i] and chr(letters[i]) or None))
+    delta.racks = []
+    for number, player in enumerate(game.roster):
+        rack = Counter(player.rack)
+        if rack != old.racks[number]:
+            delta.racks.append((number,
+                    "".join((old.racks[number] - rack).elements()),
+                    "".join((rack - old.racks[number]).elements())))
+    drawn = []
+    returned = []
+    for slot, count in enumerate(game.bag.counts):
+        tile = SLOTS[slot]
+        if count < old.bag[slot]:
+            drawn.extend([tile] * (old.bag[slot] - count))
+        elif count > old.bag[slot]:
+            returned.extend([tile] * (count - old.bag[slot]))
+    delta.drawn = "".join(drawn)
+    delta.returned = "".join(returned)
+    delta.scores = [(number, player.score - old.scores[number])
+            for number, player in enumerate(game.roster)
+            if player.score != old.scores[number]]
+    # Plays only come and go at the end of the list
+    same = min(len(game.plays), len(old.plays))
+    while same > 0 and game.plays[same - 1] is not old.plays[same - 1]:
+        same -= 1
+    delta.withdrawn = old.plays[same:]
+    delta.added = game.plays[same:]
+    delta.before = old.turn
+    delta.after = turnOf(game)
+    delta.randomBefore = old.random
+    delta.randomAfter = game.bag.rng.getstate()
+    return delta
+
+class History:
+    def __init__(self, game):
+        self.game = game
+        self.undone = [] # Records that can be undone, last turn last
+        self.redone = [] # Records that can be redone, next turn last
+        self.reset()
+
+    # Takes the game as it is now as the starting point, forgetting every
+    # record
+    def reset(self):
+        self.position = Position(self.game)
+        self.undone = []
+        self.redone = []
+
+    # Records what the turn just played changed, if it is over.  A new
+    # record means the turns that were undone can't be redone any more.
+    def endTurn(self):
+        game = self.game
+        if game.players[0] is game.curPlayer and not game.gameOver:
+            return # The player goes again (see Game.repeatTurn)
+        delta = difference(game, self.position, game.curPlayer and
+                game.roster.index(game.curPlayer))
+        self.position = Position(game)
+        if delta.isEmpty():
+            return
+        self.undone.append(delta)
+        self.redone = []
+
+    # Puts back the game as it was at the end of the last turn, throwing
+    # away what has been done since
+    def revert(self):
+        difference(self.game, self.position, None).reverse(self.game)
+
+    def canUndo(self):
+        return len(self.undone) > 0
+
+    def canRedo(self):
+        return len(self.redone) > 0
+
+    # Takes back the last turn, and returns its record (or None if there
+    # is nothing to undo)
+    def undo(self):
+        if not self.undone:
+            return None
+        delta = self.undone.pop()
+        delta.reverse(self.game)
+        self.position.follow(delta, -1)
+        self.redone.append(delta)
+        return delta
+
+    # Makes the last turn that was undone again, and returns its record
+    # (or None if there is nothing to redo)
+    def redo(self):
+        if not self.redone:
+            return None
+        delta = self.redone.pop()
+        delta.apply(self.game)
+        self.position.follow(delta, 1)
+        self.undone.append(delta)
+        return delta
+
+    # Takes back the last turn of a player, and every turn since, along
+    # with anything done in the turn in progress.  Returns the records
+    # undone, last turn first; there are none if the player has no turn to
+    # take back.
+    def undoTurnOf(self, player):
+        number = self.game.roster.index(player)
+        if number not in [delta.mover for delta in self.undone]:
+            return []
+        self.revert()
+        records = []
+        while len(records) == 0 or records[-1].mover != number:
+            records.append(self.undo())
+        return records
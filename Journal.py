@@ -0,0 +1,258 @@
+#!/usr/bin/python
+
+# Game journal.  Every change to the state of a game is appended to a file
+# as one line of compact JSON, so a game that was quit or crashed can be
+# picked up where it left off (scrabble.py --resume).  Players are given
+# by their number in the roster.  The records are:
+#
+#   ["draw", player, "AEIRST"]            tiles drawn from the bag
+#   ["exchange", player, "QV", "EN"]      tiles put back, tiles drawn
+#   ["play", player, [[7, 7, "C"], ...]]  a play that was accepted
+#   ["withdraw"]                          last play taken back (challenge)
+#   ["scoreless"]                         a pass or exchange
+#   ["finish", player]                    going out wasn't challenged
+#   ["turn", order, fresh, challenge, n]  end of a turn (see endTurn)
+#   ["snapshot", {...}]                   the whole game (see snapshot)
+#
+# Records are kept in memory during a turn, and at the end of the turn they
+# are written out with a "turn" record and synced to the disk.  A turn
+# whose "turn" record didn't make it to the disk never happened, so a crash
+# loses at most the turn in progress.
+#
+# Every SNAPSHOT_INTERVAL turns the journal is started again with a
+# snapshot of the game as its only record (written to a new file that then
+# replaces the old one), so resuming reads one snapshot and at most that
+# many turns, however long the game has gone on.
+
+import os
+import json
+from collections import deque
+import Game
+import Play
+import AIPlayer
+from letters import tileFor
+
+FILENAME = "scrabble.journal"
+
+# Turns between snapshots
+SNAPSHOT_INTERVAL = 10
+
+# This class records a game in a journal file.  Creating one starts the
+# file again with a snapshot of the game as it is now.
+class Journal:
+    def __init__(self, game, filename=FILENAME):
+        self.game = game
+        self.filename = filename
+        self.waiting = [] # Records of the turn in progress
+        self.turns = 0 # Turns since the last snapshot
+        self.journalFile = None
+        self.snapshot()
+
+    def add(self, record):
+        self.waiting.append(record)
+
+    def draw(self, player, tiles):
+        self.add(["draw", self.game.roster.index(player), "".join(tiles)])
+
+    def exchange(self, player, returned, drawn):
+        self.add(["exchange", self.game.roster.index(player),
+                "".join(returned), "".join(drawn)])
+
+    def play(self, play):
+        self.add(["play", self.game.roster.index(play.player),
+                tilesOf(play)])
+
+    def withdraw(self):
+        self.add(["withdraw"])
+
+    def scoreless(self):
+        self.add(["scoreless"])
+
+    def finish(self, outPlayer):
+        self.add(["finish", self.game.roster.index(outPlayer)])
+
+    # Ends the turn: adds a record of whose turn comes next, whether each
+    # player is starting a new turn and may challenge, and the number of
+    # turns, then writes the turn out (or takes a snapshot, if it's time)
+    def endTurn(self):
+        game = self.game
+        self.add(["turn", [game.roster.index(player)
+                for player in game.players],
+                [int(player.newTurn) for player in game.roster],
+                [int(player.canChallenge) for player in game.roster],
+                game.turnNumber])
+        self.turns += 1
+        if self.turns >= SNAPSHOT_INTERVAL:
+            self.snapshot()
+        else:
+            self.write()
+
+    # Appends the waiting records to the file and syncs it
+    def write(self):
+        lines = [encode(record) for record in self.waiting]
+        self.waiting = []
+        self.journalFile.writelines(lines)
+        self.journalFile.flush()
+        os.fsync(self.journalFile.fileno())
+
+    # Starts the journal again with a snapshot of the game.  The snapshot
+    # is written and synced to a new file before it replaces the old one,
+    # so there is always a whole journal on the disk.
+    def snapshot(self):
+        self.close()
+        newFile = self.filename + ".tmp"
+        snapshotFile = open(newFile, "w")
+        try:
+            snapshotFile.write(encode(["snapshot", snapshotOf(self.game)]))
+            snapshotFile.flush()
+            os.fsync(snapshotFile.fileno())
+        finally:
+            snapshotFile.close()
+        os.rename(newFile, self.filename)
+        self.journalFile = open(self.filename, "a")
+        self.waiting = []
+        self.turns = 0
+
+    def close(self):
+        if self.journalFile is not None:
+            self.journalFile.close()
+            self.journalFile = None
+
+def encode(record):
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+# [x, y, letter] for each tile of a play
+def tilesOf(play):
+    return [[square.x, square.y, square.letter] for square in play.squares]
+
+# Returns a dictionary of everything needed to set up the game again.
+# The board isn't saved: it holds exactly the tiles of the plays, which
+# are.  Tiles a player has put down but not submitted count as on their
+# rack.
+def snapshotOf(game):
+    roster = game.roster
+    computers = len([player for player in roster
+            if isinstance(player, AIPlayer.AIPlayer)])
+    racks = []
+    for player in roster:
+        rack = list(player.rack) + list(player.exchanged)
+        rack.extend([tileFor(square.letter)
+                for square in player.used])
+        racks.append("".join(rack))
+    return {"intl": game.dictionary == "sowpods.txt",
+            "challenge": game.challenge,
+            "names": [player.name for player in roster],
+            "computers": computers,
+            "plays": [[roster.index(play.player), tilesOf(play)]
+                    for play in game.plays],
+            "racks": racks,
+            "scores": [player.score for player in roster],
+            "bag": game.bag.counts,
+            "scoreless": game.scoreless,
+            "finished": game.finished,
+            "order": [roster.index(player) for player in game.players],
+            "fresh": [int(player.newTurn) for player in roster],
+            "challenges": [int(player.canChallenge) for player in roster],
+            "turn": game.turnNumber}
+
+# Returns the records of a journal file, up to the end of the last turn
+# that was written out in full
+def readJournal(filename):
+    records = []
+    turn = []
+    journalFile = open(filename)
+    try:
+        for line in journalFile:
+            try:
+                record = json.loads(line)
+            except ValueError: # Cut off by a crash
+                break
+            turn.append(record)
+            if record[0] in ("turn", "snapshot"):
+                records.extend(turn)
+                turn = []
+    finally:
+        journalFile.close()
+    if len(records) == 0 or records[0][0] != "snapshot":
+        raise ValueError(filename + " is not a game journal")
+    return records
+
+# Rebuilds the game recorded in a journal file and returns it.  headless
+# and seed are as for Game.Game.
+def resume(filename=FILENAME, headless=False, seed=None):
+    records = readJournal(filename)
+    state = records[0][1]
+    names = [str(name) for name in state["names"]]
+    game = Game.Game(state["intl"], state["challenge"], headless, names,
+            seed, state["computers"])
+    restore(game, state)
+    for record in records[1:]:
+        replay(game, record)
+    game.history.reset() # Turns before the resume can't be undone
+    return game
+
+# Sets up a new game as it was when a snapshot was taken
+def restore(game, state):
+    roster = game.roster
+    for number, tiles in state["plays"]:
+        game.plays.append(placePlay(game, roster[number], tiles))
+    for player, rack, score in zip(roster, state["racks"], state["scores"]):
+        for tile in str(rack):
+            player.putOnRack(tile)
+        player.score = score
+    game.bag.setState((state["bag"], game.bag.rng.getstate()))
+    game.scoreless = state["scoreless"]
+    game.finished = state["finished"]
+    game.gameOver = game.finished
+    setTurn(game, state["order"], state["fresh"], state["challenges"],
+            state["turn"])
+
+# Puts a play's tiles on the board for a player, and returns the play
+def placePlay(game, player, tiles):
+    for x, y, letter in tiles:
+        game.board.changeLetter(x, y, str(letter))
+        player.used.append(game.board.square(x, y))
+    play = Play.Play(game, player)
+    player.clearUsed()
+    return play
+
+def setTurn(game, order, fresh, challenges, turnNumber):
+    roster = game.roster
+    game.players = deque([roster[number] for number in order])
+    for player, newTurn, canChallenge in zip(roster, fresh, challenges):
+        player.newTurn = bool(newTurn)
+        player.canChallenge = bool(canChallenge)
+    game.turnNumber = turnNumber
+
+# Makes the change in one record to a game that isn't being journaled
+def replay(game, record):
+    event = record[0]
+    if event == "draw":
+        player = game.roster[record[1]]
+        for tile in str(record[2]):
+            game.bag.remove(tile)
+            player.putOnRack(tile)
+    elif event == "exchange":
+        # In the same order as the exchange screen: the tiles go onto the
+        # exchange rack, the new ones are drawn, then the old ones go back
+        # in the bag
+        player = game.roster[record[1]]
+        for tile in str(record[2]):
+            player.takeOffRack(tile)
+        for tile in str(record[3]):
+            game.bag.remove(tile)
+            player.putOnRack(tile)
+        game.bag.addTiles(str(record[2]))
+    elif event == "play":
+        player = game.roster[record[1]]
+        for x, y, letter in record[2]:
+            player.takeOffRack(tileFor(str(letter)))
+        game.scorePlay(placePlay(game, player, record[2]))
+    elif event == "withdraw":
+        game.withdrawPlay()
+    elif event == "scoreless":
+        game.scorelessTurn()
+    elif event == "finish":
+        game.finishGame(game.roster[record[1]])
+    elif event == "turn":
+        setTurn(game, *record[1:])
@@ -0,0 +1,258 @@
+#!/usr/bin/python
+
+# Rack leave values.  The "leave" of a move is the tiles it leaves on the
+# rack, and some leaves are worth more than others: ERS sets up the next
+# move, while UUV holds it back.  A leave table gives a value in points for
+# every leave of 1 to 6 tiles that can be drawn from the bag; a computer
+# player can then value a move at its score plus the value of its leave.
+#
+# The values come from self-play.  Computer players play many games, and
+# for every move the leave is recorded along with how much better or worse
+# than average the player's next move scored.  Few leaves are seen often
+# enough to trust their average, so each one is pulled towards the sum of
+# the values of its single tiles, more so the fewer times it was seen.
+#
+# A table is stored next to its word list (as TWL06.txt.leaves, say) and
+# mapped into memory when loaded, like the lexicon cache.  Each leave is
+# packed into a 32-bit key (see packLeave), the keys are stored sorted, and
+# a leave is found by binary search on the mapped file, so nothing is
+# unpacked at startup.
+
+import os
+import mmap
+import random
+import struct
+from array import array
+import letters
+import Game
+import Dawg
+import MoveGen
+import TileBag
+
+# Table file layout (all numbers little-endian): header, then count uint32
+# keys in increasing order, then count float32 values in the same order
+MAGIC = "LEAV"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+KEY = struct.Struct("<I")
+VALUE = struct.Struct("<f")
+SUFFIX = ".leaves"
+
+# Longest leave in the table (a move uses at least one tile)
+MAX_LEAVE = 6
+
+# Bits per tile in a packed key (slots 0-26 are stored as 1-27)
+TILE_BITS = 5
+
+# How many sightings of a leave count for as much as the estimate from its
+# single tiles
+PRIOR_WEIGHT = 10.0
+
+# Packs a leave into a number: the bag slots of its tiles (see TileBag),
+# plus one, in increasing order, TILE_BITS bits each.  Every multiset of up
+# to 6 tiles has its own key, and the empty leave is 0.
+def packLeave(leave):
+    key = 0
+    for slot in sorted([TileBag.slotOf[tile] for tile in leave]):
+        key = (key << TILE_BITS) | (slot + 1)
+    return key
+
+# Returns the tiles of a packed leave
+def unpackLeave(key):
+    leave = []
+    while key:
+        leave.append(TileBag.SLOTS[(key & ((1 << TILE_BITS) - 1)) - 1])
+        key >>= TILE_BITS
+    leave.reverse()
+    return leave
+
+# This class is a leave table mapped from its file.
+class LeaveTable:
+    def __init__(self, filename):
+        self.filename = filename
+        table = open(filename, 'rb')
+        try:
+            self.map = mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            table.close()
+        magic, version, self.count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or \
+                len(self.map) != HEADER.size + 8 * self.count:
+            self.map.close()
+            raise IOError("Not a leave table: " + filename)
+        self.keysStart = HEADER.size
+        self.valuesStart = self.keysStart + 4 * self.count
+
+    # Returns the value of a leave (a list of tiles), or 0 for the empty
+    # leave and any leave not in the table
+    def value(self, leave):
+        if len(leave) == 0 or len(leave) > MAX_LEAVE:
+            return 0.0
+        key = packLeave(leave)
+        mm = self.map
+        keysStart = self.keysStart
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) / 2
+            found = KEY.unpack_from(mm, keysStart + 4 * middle)[0]
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                return VALUE.unpack_from(mm, self.valuesStart + 4 * middle)[0]
+        return 0.0
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.map.close()
+
+# Loads the leave table for a word list, or returns None if there isn't one
+def load(filename):
+    try:
+        return LeaveTable(filename + SUFFIX)
+    except (IOError, OSError, ValueError, struct.error):
+        return None
+
+# Returns an evaluation for AIPlayer that values a move at its score plus
+# the value of its leave.  Once the bag is empty, leaves count for nothing.
+def evaluation(table):
+    def evaluate(game, player, move):
+        if len(game.bag) == 0:
+            return move.score
+        leave = list(player.rack)
+        for x, y, letter in move.tiles:
+            leave.remove(letters.tileFor(letter))
+        return move.score + table.value(leave)
+    return evaluate
+
+#### Building tables.
+
+# Plays games between two players who each play their highest-scoring move
+# (or swap their whole rack if they have none), and returns (stats,
+# average), where stats maps the packed key of each leave seen to [times
+# seen, total of the next move's score] and average is the average score of
+# a move.
+def selfPlay(lexicon, games, seed=None):
+    rng = random.Random(seed)
+    stats = {}
+    totalScore = 0
+    moves = 0
+    for game in range(games):
+        board = Game.Board(lexicon)
+        bag = TileBag.TileBag(letters.frequency, rng.getrandbits(32))
+        racks = [bag.drawTiles(7), bag.drawTiles(7)]
+        lastLeave = [None, None] # Key of each player's last leave
+        scoreless = 0
+        player = 0
+        while scoreless < 6:
+            rack = racks[player]
+            move = MoveGen.bestMove(board, rack, lexicon)
+            score = 0
+            if move is not None:
+                score = move.score
+                for x, y, letter in move.tiles:
+                    board.changeLetter(x, y, letter)
+                    rack.remove(letters.tileFor(letter))
+            elif len(bag) >= 7:
+                swapped = list(rack)
+                del rack[:]
+                rack.extend(bag.drawTiles(7))
+                bag.addTiles(swapped)
+            if lastLeave[player] is not None:
+                entry = stats.setdefault(lastLeave[player], [0, 0])
+                entry[0] += 1
+                entry[1] += score
+                totalScore += score
+                moves += 1
+            lastLeave[player] = None
+            if move is not None and len(bag) > 0 and \
+                    0 < len(rack) <= MAX_LEAVE:
+                lastLeave[player] = packLeave(rack)
+            rack.extend(bag.drawTiles(7 - len(rack)))
+            if len(rack) == 0:
+                break # Went out
+            if score > 0:
+                scoreless = 0
+            else:
+                scoreless += 1
+            player = 1 - player
+    return stats, float(totalScore) / max(moves, 1)
+
+# Works out the value of each single tile from self-play stats: the
+# numbers that, added up over a leave's tiles, best match how much better
+# than average the next move scored.  Found by adjusting each tile's value
+# in turn (backfitting).
+def tileValues(stats, average, rounds=5):
+    values = dict([(tile, 0.0) for tile in TileBag.SLOTS])
+    seen = [(unpackLeave(key), entry) for key, entry in stats.items()]
+    for i in range(rounds):
+        for tile in TileBag.SLOTS:
+            total = 0.0
+            weight = 0
+            for leave, entry in seen:
+                copies = leave.count(tile)
+                if copies == 0:
+                    continue
+                others = sum([values[other] for other in leave]) - \
+                        copies * values[tile]
+                residual = entry[1] - entry[0] * (average + others)
+                total += residual / copies
+                weight += entry[0]
+            if weight > 0:
+                values[tile] = total / weight
+    return values
+
+# Returns every leave of 1 to MAX_LEAVE tiles that can be drawn from a bag
+# with the given frequencies, as packed keys in increasing order
+def allLeaves(frequency):
+    slots = [slot for slot in range(len(TileBag.SLOTS))
+            if frequency.get(TileBag.SLOTS[slot], 0) > 0]
+    keys = []
+
+    # Adds the leaves made by adding tiles from slots[i:] to key
+    def extend(key, length, i):
+        if length > 0:
+            keys.append(key)
+        if length == MAX_LEAVE:
+            return
+        for j in range(i, len(slots)):
+            slot = slots[j]
+            limit = min(frequency[TileBag.SLOTS[slot]], MAX_LEAVE - length)
+            newKey = key
+            for copies in range(1, limit + 1):
+                newKey = (newKey << TILE_BITS) | (slot + 1)
+                extend(newKey, length + copies, j + 1)
+    extend(0, 0, 0)
+    keys.sort()
+    return keys
+
+# Builds a leave table from self-play stats and writes it to a file
+def build(stats, average, filename, frequency=letters.frequency):
+    values = tileValues(stats, average)
+    keys = allLeaves(frequency)
+    keyArray = array('I', keys)
+    valueArray = array('f')
+    for key in keys:
+        leave = unpackLeave(key)
+        prior = sum([values[tile] for tile in leave])
+        entry = stats.get(key)
+        if entry is None:
+            valueArray.append(prior)
+        else:
+            seen, total = entry
+            observed = total - seen * average
+            valueArray.append((observed + PRIOR_WEIGHT * prior) /
+                    (seen + PRIOR_WEIGHT))
+    keyArray = Dawg.littleEndian(keyArray)
+    valueArray = Dawg.littleEndian(valueArray)
+    tempFile = filename + ".tmp"
+    table = open(tempFile, 'wb')
+    table.write(HEADER.pack(MAGIC, VERSION, len(keys)))
+    table.write(keyArray.tostring())
+    table.write(valueArray.tostring())
+    table.close()
+    os.rename(tempFile, filename)
@@ -0,0 +1,238 @@
+#!/usr/bin/python
+
+# This class represents the dictionary used to check words.  The word list
+# is compiled once into a binary cache file next to it (see buildCache), and
+# later launches map that file into memory instead of parsing the word list
+# again.  Every Play shares the same Lexicon, and checking a word is a hash
+# table probe into the mapped file.
+
+import mmap
+import os
+import struct
+import hashlib
+import zlib
+import Dawg
+
+# Cache file layout (all integers little-endian):
+#   header  - see HEADER below
+#   offsets - (count + 1) uint32 offsets of each word in the blob
+#   slots   - numSlots uint32 word indices, EMPTY_SLOT if unused
+#   blob    - the sorted words, each followed by a newline
+MAGIC = "LEXC"
+VERSION = 1
+HEADER = struct.Struct("<4sIQd20sIII")
+EMPTY_SLOT = 0xFFFFFFFF
+CACHE_SUFFIX = ".lex"
+
+# Cross-check masks have one bit per letter, A in the lowest bit
+letterBit = dict([(chr(ord('A') + i), 1 << i) for i in range(26)])
+ALL_LETTERS = (1 << 26) - 1
+MAX_CROSS_CHECKS = 100000 # Number of cross-checks to remember
+
+class Lexicon:
+    def __init__(self, filename, useCache=True):
+        self.filename = filename
+        self.cacheFile = filename + CACHE_SUFFIX
+        self.map = None
+        self.words = None
+        self.dawg = None # Word graphs, loaded when first needed
+        self.gaddag = None
+        self.crossChecks = {} # Cross-check masks seen so far
+        if useCache:
+            try:
+                self.map = loadCache(filename, self.cacheFile)
+            except (IOError, OSError):
+                self.map = None # Cache can't be written; use a plain set
+        if self.map is not None:
+            header = HEADER.unpack_from(self.map, 0)
+            self.count = header[5]
+            self.numSlots = header[6]
+            self.offsetsStart = HEADER.size
+            self.slotsStart = self.offsetsStart + 4 * (self.count + 1)
+            self.blobStart = self.slotsStart + 4 * self.numSlots
+        else:
+            self.words = frozenset(readWords(filename))
+            self.count = len(self.words)
+
+    # Checks to see if a word is in the lexicon.  The word must already be
+    # normalized (see normalize()); nothing is stripped or copied here.
+    def contains(self, word):
+        if self.words is not None:
+            return word in self.words
+        mm = self.map
+        mask = self.numSlots - 1
+        slot = zlib.crc32(word) & mask
+        while 1:
+            index = struct.unpack_from("<I", mm, self.slotsStart + 4 * slot)[0]
+            if index == EMPTY_SLOT:
+                return False
+            if self.wordAt(index) == word:
+                return True
+            slot = (slot + 1) & mask
+
+    # Returns the word with the given index (words are stored sorted)
+    def wordAt(self, index):
+        start, end = struct.unpack_from("<II", self.map,
+                self.offsetsStart + 4 * index)
+        return self.map[self.blobStart + start:self.blobStart + end - 1]
+
+    # Iterates over every word in the lexicon, in sorted order
+    def iterWords(self):
+        if self.words is not None:
+            return iter(sorted(self.words))
+        blob = self.map[self.blobStart:]
+        return iter(blob.split())
+
+    # Returns the DAWG of the word list (see Dawg.py)
+    def getDawg(self):
+        if self.dawg is None:
+            self.dawg = Dawg.load(self, Dawg.Dawg)
+        return self.dawg
+
+    # Returns the GADDAG of the word list (see Dawg.py)
+    def getGaddag(self):
+        if self.gaddag is None:
+            self.gaddag = Dawg.load(self, Dawg.Gaddag)
+        return self.gaddag
+
+    # Returns the cross-check mask for an empty square, given the tiles
+    # directly before and after it in the other direction: the mask of
+    # letters L for which before + L + after is a word.  Masks are
+    # remembered, since the same short fragments turn up again and again.
+    def crossCheck(self, before, after):
+        key = (before, after)
+        mask = self.crossChecks.get(key)
+        if mask is not None:
+            return mask
+        dawg = self.getDawg()
+        mask = 0
+        node = dawg.walk(before)
+        if node is not None:
+            for letter, nextNode in dawg.children(node):
+                end = dawg.walk(after, nextNode)
+                if end is not None and dawg.isTerminal(end):
+                    mask |= letterBit[letter]
+        if len(self.crossChecks) >= MAX_CROSS_CHECKS:
+            self.crossChecks.clear()
+        self.crossChecks[key] = mask
+        return mask
+
+    def __contains__(self, word):
+        return self.contains(word)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self.iterWords()
+
+# Puts a word typed by a user into the form stored in the lexicon
+def normalize(word):
+    return word.strip().upper()
+
+# Reads the words out of a word list (one uppercase word per line)
+def readWords(filename):
+    wordFile = open(filename, 'r')
+    words = wordFile.read().split()
+    wordFile.close()
+    return words
+
+# Returns the sha1 digest of a file's contents
+def fileHash(filename):
+    sourceFile = open(filename, 'rb')
+    digest = hashlib.sha1(sourceFile.read()).digest()
+    sourceFile.close()
+    return digest
+
+# Maps the cache for a word list into memory, building it first if it is
+# missing or out of date (see cacheIsCurrent).
+def loadCache(filename, cacheFile):
+    mm = openCache(cacheFile)
+    if mm is not None:
+        if cacheIsCurrent(filename, cacheFile, HEADER.unpack_from(mm, 0)):
+            return mm
+        mm.close()
+    buildCache(filename, cacheFile)
+    return openCache(cacheFile)
+
+# Checks whether a cache file is current for its word list, given the
+# fields of its header (magic, version, size, mtime and sha1 come first in
+# every cache header).  The cache is current if the word list's size and
+# mtime match the ones recorded in the header.  If they don't, the contents
+# are hashed, and if the hash still matches the header is just brought up
+# to date instead of the cache being rebuilt.
+def cacheIsCurrent(filename, cacheFile, header, headerStruct=HEADER):
+    stat = os.stat(filename)
+    if header[2] == stat.st_size and header[3] == stat.st_mtime:
+        return True
+    if header[4] == fileHash(filename):
+        touchCache(cacheFile, stat, headerStruct)
+        return True
+    return False
+
+# Maps a cache file into memory, or returns None if it doesn't exist or
+# isn't a cache of the current version
+def openCache(cacheFile):
+    try:
+        cache = open(cacheFile, 'rb')
+    except IOError:
+        return None
+    try:
+        if os.fstat(cache.fileno()).st_size < HEADER.size:
+            return None
+        mm = mmap.mmap(cache.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        cache.close()
+    magic, version = HEADER.unpack_from(mm, 0)[:2]
+    if magic != MAGIC or version != VERSION:
+        mm.close()
+        return None
+    return mm
+
+# Records a new size and mtime in the header of an existing cache
+def touchCache(cacheFile, stat, headerStruct=HEADER):
+    cache = open(cacheFile, 'r+b')
+    header = list(headerStruct.unpack(cache.read(headerStruct.size)))
+    header[2] = stat.st_size
+    header[3] = stat.st_mtime
+    cache.seek(0)
+    cache.write(headerStruct.pack(*header))
+    cache.close()
+
+# Compiles a word list into a cache file.  The file is written under a
+# temporary name and renamed into place, so a reader never sees a partial
+# cache.
+def buildCache(filename, cacheFile):
+    stat = os.stat(filename)
+    digest = fileHash(filename)
+    words = sorted(set(readWords(filename)))
+    count = len(words)
+
+    # Open addressing table at most two-thirds full
+    numSlots = 1
+    while numSlots * 2 < count * 3:
+        numSlots *= 2
+    mask = numSlots - 1
+
+    offsets = []
+    slots = [EMPTY_SLOT] * numSlots
+    position = 0
+    for index in range(count):
+        word = words[index]
+        offsets.append(position)
+        position += len(word) + 1
+        slot = zlib.crc32(word) & mask
+        while slots[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+        slots[slot] = index
+    offsets.append(position)
+
+    tempFile = cacheFile + ".tmp"
+    cache = open(tempFile, 'wb')
+    cache.write(HEADER.pack(MAGIC, VERSION, stat.st_size, stat.st_mtime,
+            digest, count, numSlots, position))
+    cache.write(struct.pack("<%dI" % len(offsets), *offsets))
+    cache.write(struct.pack("<%dI" % numSlots, *slots))
+    cache.write("\n".join(words) + "\n")
+    cache.close()
+    os.rename(tempFile, cacheFile)
@@ -0,0 +1,519 @@
+#!/usr/bin/python
+
+# This file finds every legal move for a rack on the current board, using
+# the GADDAG method from Gordon's "A Faster Scrabble Move Generation
+# Algorithm."  Moves are found one line (row or column) at a time.  In each
+# line, every empty square next to a tile is an "anchor," and every move
+# covers at least one anchor.  For each anchor, the generator puts a tile
+# on it and follows the GADDAG outwards: leftwards to the start of the
+# word, then across the separator and rightwards to its end, so only parts
+# of real words are ever tried.  Each empty square also has a
+# "cross-check": the letters that form a word with the tiles above and
+# below it (or to its left and right, for vertical moves).  Only those
+# letters may go there.  A move is found from the leftmost anchor it
+# covers.
+#
+# The squares to the left of an anchor are either tiles on the board or
+# empty squares with nothing next to them, so the left parts that fit on
+# them don't depend on the anchor.  They are built once per rack and
+# shared by every anchor (see partsFrom).
+#
+# A blank on the rack is tried only as the letters that both have an edge
+# out of the node reached so far and pass the square's cross-check, so
+# most of the 26 letters are never tried at all.  In the moves found, a
+# blank is the lower-case letter it stands for.
+#
+# Moves are scored with the same rules as Play.scorePlay.
+
+import multiprocessing
+from constants import *
+from bonus import squareBonus, letterMultiplier, wordMultiplier
+from Lexicon import letterBit
+from Dawg import SEPARATOR
+import letters
+import Lexicon
+import Game
+
+# Number of GADDAG nodes whose edges are kept as dictionaries before they
+# are thrown away and built again as needed
+MAX_EDGE_MAPS = 200000
+
+# Cross-check bit for each GADDAG edge label; a blank never stands for
+# the separator
+edgeBit = dict(letterBit)
+edgeBit[SEPARATOR] = 0
+
+# This class represents a move found by the generator.
+class Move:
+    def __init__(self, tiles, horizontal, words, score):
+        self.tiles = tiles # List of (x, y, letter) for each new tile
+        self.horizontal = horizontal
+        self.words = words # Main word first, then any cross words
+        self.score = score
+
+    def __repr__(self):
+        x, y = self.tiles[0][:2]
+        return "<Move %s at (%d, %d) %s for %d>" % (self.words[0], x, y,
+                self.horizontal and "across" or "down", self.score)
+
+# This class keeps the edges of the GADDAG nodes the generator has been to
+# as dictionaries from label to node, since looking a label up in one is
+# much quicker than searching the GADDAG's flat arrays for it.
+class EdgeMaps:
+    def __init__(self, gaddag):
+        self.gaddag = gaddag
+        self.edges = {} # Node -> {label: node}
+
+    def edgesOf(self, node):
+        edges = self.edges.get(node)
+        if edges is None:
+            gaddag = self.gaddag
+            start = gaddag.first[node]
+            end = gaddag.first[node + 1]
+            edges = dict(zip(gaddag.labels[start:end],
+                    gaddag.targets[start:end]))
+            self.edges[node] = edges
+        return edges
+
+# The EdgeMaps of each word list, by file name
+edgeMaps = {}
+
+def edgeMapsFor(lexicon):
+    maps = edgeMaps.get(lexicon.filename)
+    if maps is None or len(maps.edges) >= MAX_EDGE_MAPS:
+        maps = EdgeMaps(lexicon.getGaddag())
+        edgeMaps[lexicon.filename] = maps
+    return maps
+
+# Yields every legal move for a rack (a list of letters) on a board
+def generateMoves(board, rack, lexicon):
+    return generateLines(board, rack, lexicon, anchorLines(board))
+
+# Yields the legal moves along some of the board's lines, given as a list of
+# (direction, line) pairs.  If scoresOnly is true, it yields only the best
+# score on each line instead, without building any moves.
+def generateLines(board, rack, lexicon, lines, scoresOnly=False):
+    maps = edgeMapsFor(lexicon)
+    cells = board.cells()
+    rackCounts = {}
+    for letter in rack:
+        rackCounts[letter] = rackCounts.get(letter, 0) + 1
+    firstMove = board.isEmpty()
+    leftParts = {}
+
+    for direction, line in lines:
+        info = lineInfo(board, cells, direction, line, firstMove)
+        for move in generateLine(maps, info, line, direction, rackCounts,
+                leftParts, scoresOnly):
+            yield move
+
+# Returns a list of every legal move, best score first
+def allMoves(board, rack, lexicon):
+    moves = list(generateMoves(board, rack, lexicon))
+    moves.sort(key=lambda move: -move.score)
+    return moves
+
+# Returns the highest-scoring move, or None if there are no legal moves
+def bestMove(board, rack, lexicon):
+    best = None
+    for move in generateMoves(board, rack, lexicon):
+        if best is None or move.score > best.score:
+            best = move
+    return best
+
+# Returns the score of the highest-scoring move, or None if there are no
+# legal moves.  This is much quicker than bestMove, since no Moves (or
+# their tiles and words) are built.
+def bestScore(board, rack, lexicon):
+    best = None
+    for score in generateLines(board, rack, lexicon, anchorLines(board),
+            True):
+        best = max(best, score)
+    return best
+
+# Returns the (direction, line) pairs of the lines with an anchor in them,
+# rows first.  Moves can only be made along those lines.
+def anchorLines(board):
+    if board.isEmpty():
+        return [(ACROSS, CENTER_Y), (DOWN, CENTER_X)]
+    lines = []
+    columns = 0 # Bit x set if column x has an anchor
+    for y in range(BOARDSIZE_Y):
+        if board.anchorBits[y]:
+            lines.append((ACROSS, y))
+            columns |= board.anchorBits[y]
+    for x in range(BOARDSIZE_X):
+        if (columns >> x) & 1:
+            lines.append((DOWN, x))
+    return lines
+
+# Board coordinates of position pos on a line
+def coords(direction, line, pos):
+    if direction == ACROSS:
+        return pos, line
+    return line, pos
+
+# Works out what the generator needs to know about one line (a row, or a
+# column for DOWN).  Returns a list of positions, where each position is a
+# tuple of:
+#   letter     - the letter on the square, or None
+#   mask       - cross-check mask of letters allowed on the square
+#   crossSum   - total score of the tiles in the cross word through the
+#                square, or -1 if a tile there wouldn't form a cross word
+#   crossParts - (before, after) strings of the cross word, or None
+#   isAnchor   - True if a move must cover this square or one like it
+#   letterMult - letter multiplier of the square
+#   wordMult   - word multiplier of the square
+# The cross-checks come from the board's tables (see Game.Board).
+def lineInfo(board, cells, direction, line, firstMove):
+    crossChecks = board.crossChecks[direction]
+    crossSums = board.crossSums[direction]
+    crossParts = board.crossParts[direction]
+    info = []
+    for pos in range(BOARDSIZE_X):
+        x, y = coords(direction, line, pos)
+        i = y * BOARDSIZE_X + x
+        letter = cells[i]
+        bonus = squareBonus[i]
+        isAnchor = False
+        if letter is None:
+            if firstMove:
+                isAnchor = (x == CENTER_X and y == CENTER_Y)
+            else:
+                isAnchor = board.isAnchor(x, y)
+        info.append((letter, crossChecks[i], crossSums[i], crossParts[i],
+                isAnchor, letterMultiplier[bonus], wordMultiplier[bonus]))
+    return info
+
+# Yields the moves along one line.  rack maps each tile on the rack to the
+# number of copies left, and leftParts holds the left parts built so far
+# for the rack (see partsFrom).  If scoresOnly is true, it yields only the
+# best score on the line, if there's a move on it.
+#
+# Edges are looked up in the EdgeMaps' dictionaries directly, since this
+# is where the generator spends its time.
+def generateLine(maps, info, line, direction, rack, leftParts,
+        scoresOnly=False):
+    edges = maps.edges
+    edgesOf = maps.edgesOf
+    terminal = maps.gaddag.terminal
+    score = letters.score
+    blank = letters.BLANK
+    rack.setdefault(blank, 0)
+    rackLetters = [letter for letter in rack.keys() if letter != blank]
+    size = len(info)
+    across = direction == ACROSS
+    onBoard = [square[0] for square in info]
+    places = [coords(direction, line, pos) for pos in range(size)]
+    # The tiles on the board from each position up to the next empty
+    # square, as they are and as GADDAG labels
+    runs = []
+    runLabels = []
+    for pos in range(size + 1):
+        end = pos
+        while end < size and onBoard[end] is not None:
+            end += 1
+        runs.append("".join(onBoard[pos:end]))
+        runLabels.append(runs[pos].upper())
+    root = edgesOf(0)
+    moves = []
+
+    # Follows labels from a node; returns the node reached, or None
+    def walk(node, labels):
+        for label in labels:
+            node = (edges.get(node) or edgesOf(node)).get(label)
+            if node is None:
+                return None
+        return node
+
+    # Scores a move whose main word starts at start
+    def record(word, start):
+        mainScore = 0
+        multiplier = 1
+        crossTotal = 0
+        crossWords = []
+        tiles = []
+        pos = start
+        for letter in word:
+            square = info[pos]
+            if square[0] is not None:
+                mainScore += score[letter]
+            else:
+                letterScore = score[letter] * square[5]
+                mainScore += letterScore
+                multiplier *= square[6]
+                if square[2] >= 0:
+                    crossTotal += (square[2] + letterScore) * square[6]
+                    crossWords.append(square[3][0] + letter + square[3][1])
+                tiles.append(places[pos] + (letter,))
+            pos += 1
+        total = mainScore * multiplier + crossTotal
+        if len(tiles) == 7:
+            total += BINGO_BONUS
+        moves.append(Move(tiles, across, [word] + crossWords, total))
+
+    # Scores a move like record, but keeps only the score
+    def recordScore(word, start):
+        mainScore = 0
+        multiplier = 1
+        crossTotal = 0
+        newTiles = 0
+        pos = start
+        for letter in word:
+            square = info[pos]
+            if square[0] is not None:
+                mainScore += score[letter]
+            else:
+                letterScore = score[letter] * square[5]
+                mainScore += letterScore
+                multiplier *= square[6]
+                if square[2] >= 0:
+                    crossTotal += (square[2] + letterScore) * square[6]
+                newTiles += 1
+            pos += 1
+        total = mainScore * multiplier + crossTotal
+        if newTiles == 7:
+            total += BINGO_BONUS
+        moves.append(total)
+
+    if scoresOnly:
+        record = recordScore
+
+    # Returns the left parts that can be built leftwards from node (the
+    # GADDAG node after the tile on an anchor, whose letter is word) with
+    # the rest of the rack.  Each is a tuple of (length, word, tiles,
+    # isWord, after): the number of tiles to the left of the anchor, the
+    # letters from the start of the word to the anchor, the rack tiles
+    # used, whether the letters are a whole word, and the node across the
+    # separator, from which the word carries on to the right.  They are
+    # sorted by length.
+    def partsFrom(node, word):
+        parts = leftParts.get((node, word))
+        if parts is None:
+            parts = []
+            buildParts(node, word, "", parts)
+            parts.sort(key=lambda part: part[0])
+            leftParts[(node, word)] = parts
+        return parts
+
+    def buildParts(node, word, tiles, parts):
+        kids = edges.get(node) or edgesOf(node)
+        after = kids.get(SEPARATOR)
+        isWord = terminal[node] == "\x01"
+        if isWord or after is not None:
+            parts.append((len(tiles), word, tiles, isWord, after))
+        for letter in rackLetters:
+            if rack[letter]:
+                target = kids.get(letter)
+                if target is not None:
+                    rack[letter] -= 1
+                    buildParts(target, letter + word, tiles + letter, parts)
+                    rack[letter] += 1
+        if rack[blank]:
+            rack[blank] -= 1
+            for label, target in kids.items():
+                if label != SEPARATOR:
+                    buildParts(target, label.lower() + word, tiles + blank,
+                            parts)
+            rack[blank] += 1
+
+    # Carries each left part (up to limit tiles long) on to the right of an
+    # anchor
+    def extendParts(parts, anchor, limit):
+        endsHere = anchor + 1 >= size or onBoard[anchor + 1] is None
+        for length, word, tiles, isWord, after in parts:
+            if length > limit:
+                break
+            if isWord and endsHere:
+                record(word, anchor - length)
+            if after is not None and anchor + 1 < size:
+                node = after
+                if not endsHere:
+                    node = walk(after, runLabels[anchor + 1])
+                if node is not None:
+                    for tile in tiles:
+                        rack[tile] -= 1
+                    extendRight(word + runs[anchor + 1], node,
+                            anchor + 1 + len(runs[anchor + 1]),
+                            anchor - length)
+                    for tile in tiles:
+                        rack[tile] += 1
+
+    # Adds tiles to the right of a partial word, which starts at start and
+    # ends just before pos, where there's an empty square (or the edge of
+    # the board).  After each tile, the word takes in any tiles on the
+    # board that follow it.
+    def extendRight(word, node, pos, start):
+        if terminal[node] == "\x01":
+            record(word, start)
+        if pos >= size:
+            return
+        kids = edges.get(node) or edgesOf(node)
+        mask = info[pos][1]
+        run = runs[pos + 1]
+        labels = runLabels[pos + 1]
+        end = pos + 1 + len(run)
+        for letter in rackLetters:
+            if rack[letter] and mask & letterBit[letter]:
+                target = kids.get(letter)
+                for label in labels:
+                    if target is None:
+                        break
+                    target = (edges.get(target) or edgesOf(target)).get(label)
+                if target is not None:
+                    rack[letter] -= 1
+                    extendRight(word + letter + run, target, end, start)
+                    rack[letter] += 1
+        if rack[blank]:
+            rack[blank] -= 1
+            for label, target in kids.items():
+                if mask & edgeBit[label]:
+                    if labels:
+                        target = walk(target, labels)
+                    if target is not None:
+                        extendRight(word + label.lower() + run, target, end,
+                                start)
+            rack[blank] += 1
+
+    for anchor in range(size):
+        square = info[anchor]
+        if not square[4]:
+            continue
+        if anchor > 0 and onBoard[anchor - 1] is not None:
+            # The left part is the tiles already on the board
+            begin = anchor - 1
+            while begin > 0 and onBoard[begin - 1] is not None:
+                begin -= 1
+            left = "".join(onBoard[begin:anchor])
+            labels = left.upper()[::-1]
+            limit = anchor - begin
+        else:
+            # The left part is new tiles, on empty squares that aren't
+            # anchors (any left part running into an anchor is found from
+            # that anchor instead)
+            left = ""
+            labels = ""
+            limit = 0
+            pos = anchor - 1
+            while pos >= 0 and onBoard[pos] is None and not info[pos][4]:
+                limit += 1
+                pos -= 1
+        starts = []
+        for letter in rackLetters:
+            if rack[letter] and square[1] & letterBit[letter]:
+                starts.append((letter, letter, root.get(letter)))
+        if rack[blank]:
+            for label, node in root.items():
+                if square[1] & edgeBit[label]:
+                    starts.append((blank, label.lower(), node))
+        for tile, letter, node in starts:
+            if node is not None and labels:
+                node = walk(node, labels)
+            if node is None:
+                continue
+            rack[tile] -= 1
+            if labels:
+                parts = [(limit, left + letter, "", terminal[node] == "\x01",
+                        walk(node, SEPARATOR))]
+            else:
+                parts = partsFrom(node, letter)
+            extendParts(parts, anchor, limit)
+            rack[tile] += 1
+
+    if scoresOnly:
+        # A single tile found in both directions scores the same both
+        # ways, so it doesn't matter that it's counted twice
+        if moves:
+            yield max(moves)
+        return
+
+    for move in moves:
+        # A single tile that forms words both ways is found in both
+        # directions; keep only the across move
+        if direction == DOWN and len(move.tiles) == 1 and \
+                info[move.tiles[0][1]][2] >= 0:
+            continue
+        yield move
+
+#### Generating moves in parallel.
+#
+# The lines with anchors are dealt out to a pool of worker processes, each
+# of which loads the word list, DAWG and GADDAG once, when it starts (all
+# come from their caches, so this is quick).  A worker is sent the letters on
+# the board, the rack and its share of the lines; it rebuilds the board
+# (or reuses the last one, if the letters are the same) and sends back the
+# moves it finds.
+
+# Number of pieces the lines are split into for each worker process, so
+# that a worker that finishes early can pick up more
+SHARDS_PER_PROCESS = 2
+
+# The pool, and the (word list, processes) it was started with
+pool = None
+poolKey = None
+
+# Returns a list of every legal move, best score first, generated by the
+# given number of worker processes (by default, one per CPU)
+def allMovesParallel(board, rack, lexicon, processes=None):
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    lines = anchorLines(board)
+    numShards = min(len(lines), processes * SHARDS_PER_PROCESS)
+    boardLetters = str(board.letters)
+    tasks = [(boardLetters, rack, lines[i::numShards])
+            for i in range(numShards)]
+    moves = []
+    for shard in getPool(lexicon, processes).map(generateShard, tasks, 1):
+        moves.extend(shard)
+    moves.sort(key=lambda move: -move.score)
+    return moves
+
+# Returns a pool of worker processes for a word list, starting it if needed
+def getPool(lexicon, processes):
+    global pool, poolKey
+    key = (lexicon.filename, processes)
+    if pool is None or poolKey != key:
+        closePool()
+        pool = multiprocessing.Pool(processes, initWorker, (lexicon.filename,))
+        poolKey = key
+    return pool
+
+def closePool():
+    global pool, poolKey
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+    pool = None
+    poolKey = None
+
+# State of a worker process: its word list, and the last board it built as
+# (boardLetters, board)
+workerLexicon = None
+workerBoard = None
+
+def initWorker(filename):
+    global workerLexicon
+    workerLexicon = Lexicon.Lexicon(filename)
+    workerLexicon.getDawg()
+    workerLexicon.getGaddag()
+
+# Returns the board with the given letters (a string indexed by y*15+x,
+# with "\x00" for empty squares) in a worker process.  Don't change it.
+def workerBoardFor(boardLetters):
+    global workerBoard
+    if workerBoard is None or workerBoard[0] != boardLetters:
+        board = Game.Board(workerLexicon)
+        for i in range(len(boardLetters)):
+            if boardLetters[i] != "\x00":
+                board.changeLetter(i % BOARDSIZE_X, i / BOARDSIZE_X,
+                        boardLetters[i])
+        workerBoard = (boardLetters, board)
+    return workerBoard[1]
+
+# Runs in a worker: finds the moves along some lines.  task is
+# (boardLetters, rack, lines), where boardLetters is the board's letters as
+# a string.
+def generateShard(task):
+    boardLetters, rack, lines = task
+    board = workerBoardFor(boardLetters)
+    return list(generateLines(board, rack, workerLexicon, lines))
@@ -7,21 +7,39 @@
 import re
 from constants import *
 from letters import *
+from bonus import letterMultiplier, wordMultiplier
 
 class Play:
     def __init__(self, game, player):
         self.player = player
         # List of squares in play
         self.squares = player.used
+        # Everything worked out about the play (see PlayAnalysis)
+        self.analysis = PlayAnalysis(self, game)
         # List of words (each word is a string)
         self.words = self.getWords(game)
         self.score = self.scorePlay(game)
     
     # Check to see if the play is a legal Scrabble move
     def isLegal(self, game):
+        return self.analysis.legal
+    
+    # Check to see if a challenge should take the play off the board
+    def isValid(self, game):
+        return self.analysis.valid
+    
+    # This returns a score.
+    def scorePlay(self, game):
+        return self.analysis.score
+
+    ######### Internal methods ##########
+
+    # Works out whether the play is legal from the board.  The answer is
+    # kept in the play's analysis; use isLegal to read it.
+    def checkLegal(self, game):
         if len(self.squares) == 0: # Null plays illegal
             return False
-        if len(game.plays) == 0 and not self.passThroughCenter():
+        if len(game.plays) == 0 and not self.passThroughCenter(game.board):
             return False # First move passes through center
         if len(game.plays) == 0 and len(self.squares) == 1:
             return False # No one-tile plays on the first move
@@ -29,52 +47,24 @@ class Play:
                 (self.connectedToBoard(game) or len(game.plays) == 0):
             return True # All subsequent moves should be connected to the board
         return False
-    
-    # Check to see if a challenge should take the play off the board
-    def isValid(self, game):
-        if not self.isLegal(game):
-            return False
-        for word in self.words:
-            if verifyWord(word, game) == False:
-                return False
-        return True
-    
-    # This returns a score.
-    def scorePlay(self, game):
-        try:
-            wordList = self.findWordSquares(game)
-        except BadPlayError:
-            return 0
-        playScore = 0
-        for wordSquares in wordList:
-            wordScore = 0
-            wordBonus = 1
-            # Add the values of each letter (including letter bonuses)
-            for square in wordSquares:
-                if square.bonus == "N" or square not in self.squares:
-                    # No bonus if tile is old or it is not a bonus square
-                    letterScore = score[square.letter] 
-                elif square.bonus == "DL":
-                    letterScore = score[square.letter] * 2
-                elif square.bonus == "TL":
-                    letterScore = score[square.letter] * 3
-                elif square.bonus == "DW":
-                    letterScore = score[square.letter]
-                    wordBonus *= 2
-                elif square.bonus == "TW":
-                    letterScore = score[square.letter]
-                    wordBonus *= 3
-                else:
-                    assert False, "Wrong bonus value: " + square.bonus
-                wordScore += letterScore
-            wordScore *= wordBonus
-            playScore += wordScore
-        
-        if len(self.squares) == 7:
-            playScore += BINGO_BONUS
-        return playScore
 
-    ######### Internal methods ##########
+    # This returns the score of one word, given as a list of squares.
+    def scoreWord(self, wordSquares):
+        wordScore = 0
+        wordBonus = 1
+        # Add the values of each letter (including letter bonuses)
+        for square in wordSquares:
+            assert square.bonus in letterMultiplier, \
+                    "Wrong bonus value: " + square.bonus
+            if square not in self.squares:
+                # No bonus if tile is old
+                letterScore = score[square.letter]
+            else:
+                letterScore = score[square.letter] * \
+                        letterMultiplier[square.bonus]
+                wordBonus *= wordMultiplier[square.bonus]
+            wordScore += letterScore
+        return wordScore * wordBonus
     
     # Check to see if the squares have the same horizontal component
     def squaresInHorizLine(self):
@@ -129,34 +119,40 @@ class Play:
     # Check to see if squares are adjacent to any other square on the board
     def connectedToBoard(self, game):
         assert len(self.squares) > 0, "Must have at least one square"
-        # Get a set of all occupied squares on the board
-        occupiedSquares = set()
-        for coords in game.board.squares.keys():
-            if game.board.squares[coords].letter != None:
-                occupiedSquares.add(game.board.squares[coords])
-        
-        # Get a list of all occupied squares on the board that aren't
-        # being used in the current play
-        oldSquares = list(occupiedSquares.difference(set(self.squares)))
+        # Take the squares in the current play off the board's bitboard,
+        # leaving the tiles that were already there
+        oldRows = list(game.board.rowBits)
+        for square in self.squares:
+            oldRows[square.y] &= ~(1 << square.x)
 
         # Check if squares are connected to old squares
         for square in self.squares:
-            if square.connectedTo(oldSquares):
+            x = square.x
+            y = square.y
+            if oldRows[y] & ((1 << (x + 1)) | (1 << x >> 1)):
                 return True
-        return False
-
-    # Check to see if squares pass through center
-    def passThroughCenter(self):
-        for square in self.squares:
-            if square.x == CENTER_X and square.y == CENTER_Y:
+            if y > 0 and (oldRows[y - 1] >> x) & 1:
+                return True
+            if y < BOARDSIZE_Y - 1 and (oldRows[y + 1] >> x) & 1:
                 return True
         return False
 
+    # Check to see if squares pass through center.  This is only asked on
+    # the first move, when the play's squares are the only ones on the
+    # board.
+    def passThroughCenter(self, board):
+        return (board.rowBits[CENTER_Y] >> CENTER_X) & 1 == 1
+
     # This returns a list of "words," where each word is a list of squares
     # that make up that word.
     def findWordSquares(self, game):
         if not self.isLegal(game):
             raise BadPlayError()
+        return self.analysis.wordSquares
+
+    # Seeks out the words formed by a legal play on the board.  The words
+    # are kept in the play's analysis; use findWordSquares to read them.
+    def seekWords(self, game):
         wordList = []
         if self.squaresInHorizLine():
             for square in self.squares:
@@ -174,17 +170,17 @@ class Play:
     # This tries to find a word containing a given square in the vertical
     # direction.
     def vertSeek(self, game, square):
-        squares = game.board.squares
+        board = game.board
         word = [square]
         x = square.x
         y = square.y
-        while game.board.onBoard(x, y-1) and squares[(x, y-1)].letter != None:
-            if squares[(x, y-1)] not in word:
-                word.append(squares[(x, y-1)])
+        while game.board.onBoard(x, y-1) and board.letterAt(x, y-1) != None:
+            if board.square(x, y-1) not in word:
+                word.append(board.square(x, y-1))
             y -= 1
-        while game.board.onBoard(x, y+1) and squares[(x, y+1)].letter != None:
-            if squares[(x, y+1)] not in word:
-                word.append(squares[(x, y+1)])
+        while game.board.onBoard(x, y+1) and board.letterAt(x, y+1) != None:
+            if board.square(x, y+1) not in word:
+                word.append(board.square(x, y+1))
             y += 1
         if len(word) > 1:
             return self.sortWordSquares(word)
@@ -194,17 +190,17 @@ class Play:
     # This tries to find a word containing a given square in the horizontal
     # direction.
     def horizSeek(self, game, square):
-        squares = game.board.squares
+        board = game.board
         word = [square]
         x = square.x
         y = square.y
-        while game.board.onBoard(x-1, y) and squares[(x-1, y)].letter != None:
-            if squares[(x-1, y)] not in word:
-                word.append(squares[(x-1, y)])
+        while game.board.onBoard(x-1, y) and board.letterAt(x-1, y) != None:
+            if board.square(x-1, y) not in word:
+                word.append(board.square(x-1, y))
             x -= 1
-        while game.board.onBoard(x+1, y) and squares[(x+1, y)].letter != None:
-            if squares[(x+1, y)] not in word:
-                word.append(squares[(x+1, y)])
+        while game.board.onBoard(x+1, y) and board.letterAt(x+1, y) != None:
+            if board.square(x+1, y) not in word:
+                word.append(board.square(x+1, y))
             x += 1
         if len(word) > 1:
             return self.sortWordSquares(word)
@@ -229,28 +225,178 @@ class Play:
     
     # This returns a list of strings of words used in the play.
     def getWords(self, game):
-        try:
-            wordList = self.findWordSquares(game)
-        except BadPlayError:
+        if not self.isLegal(game):
             return None
+        return self.analysis.words
+
+# This class works out everything about a play in one pass: whether it is
+# legal, which way it runs, the squares and letters of each word it forms,
+# the score of each word and whether each word is in the dictionary.  A
+# Play makes one when it is created, and its methods read from it, so
+# submitting and later challenging a play never looks at the board again.
+class PlayAnalysis:
+    def __init__(self, play, game):
+        self.legal = play.checkLegal(game)
+        self.horizontal = None
+        self.wordSquares = []
+        self.words = []
+        self.wordScores = []
+        self.verdicts = []
+        self.score = 0
+        if not self.legal:
+            self.valid = False
+            return
+
+        self.horizontal = play.squaresInHorizLine()
+        self.wordSquares = play.seekWords(game)
+        for wordSquares in self.wordSquares:
+            self.words.append(play.getWord(wordSquares))
+            self.wordScores.append(play.scoreWord(wordSquares))
+        self.score = sum(self.wordScores)
+        if len(play.squares) == 7:
+            self.score += BINGO_BONUS
+        self.verdicts = [verifyWord(word, game) for word in self.words]
+        self.valid = all(self.verdicts)
+
+# This class keeps a preview of the play a player is putting down, to show
+# as they type: the words it forms, whether each is in the dictionary and
+# what it would score.  It is told about each tile as it goes down or comes
+# back up (see Player.addToUsed and removeFromUsed), and keeps what it has
+# worked out between keys.  A new tile's cross word only changes when a
+# tile goes down or comes up in the same column (or row, for a cross word
+# running across), so it is remembered until then, and so is every word
+# looked up in the dictionary.  Only the main word is found again on each
+# key, by scanning one row or column.
+class Preview:
+    def __init__(self):
+        self.tiles = [] # (x, y) of each new tile
+        self.crossWords = {} # (x, y, direction) -> (word, score), or None
+        self.verdicts = {} # word -> True if it is in the dictionary
+
+    def add(self, x, y):
+        self.tiles.append((x, y))
+        self.forget(x, y)
+
+    def remove(self, x, y):
+        self.tiles.remove((x, y))
+        self.forget(x, y)
+
+    def clear(self):
+        self.tiles = []
+        self.crossWords = {}
+
+    # Forgets the cross words that run through the row or column of (x, y)
+    def forget(self, x, y):
+        for key in self.crossWords.keys():
+            if (key[2] == DOWN and key[0] == x) or \
+                    (key[2] == ACROSS and key[1] == y):
+                del self.crossWords[key]
+
+    # Returns (words, score, legal), where words is a list of (word, score,
+    # inDictionary) for each word the play forms, cross words first, as in
+    # PlayAnalysis.  If the play isn't legal, words is empty.
+    def summary(self, game):
+        tiles = self.tiles
+        if len(tiles) == 0:
+            return [], 0, False
+        xs = [x for x, y in tiles]
+        ys = [y for x, y in tiles]
+        if min(ys) == max(ys):
+            direction = ACROSS
+        elif min(xs) == max(xs):
+            direction = DOWN
+        else:
+            return [], 0, False
+        board = game.board
+        if not board.isFilled(min(xs), min(ys), max(xs), max(ys)):
+            return [], 0, False
+
+        found = []
+        for x, y in tiles:
+            key = (x, y, 1 - direction)
+            if key not in self.crossWords:
+                self.crossWords[key] = self.wordThrough(board, x, y,
+                        1 - direction)
+            if self.crossWords[key] is not None:
+                found.append(self.crossWords[key])
+        main = self.wordThrough(board, tiles[0][0], tiles[0][1], direction)
+        if main is not None:
+            found.append(main)
+
+        if len(game.plays) == 0:
+            legal = (CENTER_X, CENTER_Y) in tiles and len(tiles) > 1
+        else:
+            # Connected if it forms a cross word or its main word takes in
+            # a tile that was already there
+            legal = (main is None and len(found) > 0) or \
+                    (main is not None and (len(found) > 1 or
+                            len(main[0]) > len(tiles)))
+        if not legal:
+            return [], 0, False
+
         words = []
-        for wordSquares in wordList:
-            words.append(self.getWord(wordSquares))
-        return words
+        total = 0
+        for word, wordScore in found:
+            if word not in self.verdicts:
+                self.verdicts[word] = verifyWord(word, game)
+            words.append((word, wordScore, self.verdicts[word]))
+            total += wordScore
+        if len(tiles) == 7:
+            total += BINGO_BONUS
+        return words, total, True
+
+    # Returns (word, score) for the word through (x, y) in a direction: the
+    # tile there and the tiles touching it in a line.  Returns None if no
+    # tiles touch it that way.  Bonuses count only on new tiles.
+    def wordThrough(self, board, x, y, direction):
+        dx, dy = direction == ACROSS and (1, 0) or (0, 1)
+        while x - dx >= 0 and y - dy >= 0 and \
+                board.letterAt(x - dx, y - dy) is not None:
+            x -= dx
+            y -= dy
+        letters = []
+        wordScore = 0
+        wordBonus = 1
+        while x < BOARDSIZE_X and y < BOARDSIZE_Y and \
+                board.letterAt(x, y) is not None:
+            letter = board.letterAt(x, y)
+            letters.append(letter)
+            if (x, y) in self.tiles:
+                bonus = board.square(x, y).bonus
+                wordScore += score[letter] * letterMultiplier[bonus]
+                wordBonus *= wordMultiplier[bonus]
+            else:
+                wordScore += score[letter]
+            x += dx
+            y += dy
+        if len(letters) < 2:
+            return None
+        return "".join(letters), wordScore * wordBonus
+
+    # Returns a line describing the preview, no longer than width, such as
+    # "CAT 5, ATE? 3: 8 points", where "?" marks a word that isn't in the
+    # dictionary.  Returns "" if no tiles have been put down.
+    def describe(self, game, width):
+        if len(self.tiles) == 0:
+            return ""
+        words, total, legal = self.summary(game)
+        if not legal:
+            return "Not a legal play"
+        ending = ": %d points" % total
+        line = ", ".join(["%s%s %d" % (word, (not valid and "?" or ""),
+                wordScore) for word, wordScore, valid in words])
+        if len(line) + len(ending) > width:
+            line = line[:max(width - len(ending) - 3, 0)] + "..."
+        return line + ending
 
 # Bad play exception
 class BadPlayError(Exception):
     pass
 
-# Checks to see if a word is in the dictionary
+# Checks to see if a word is in the dictionary.  Words built from board
+# squares have blanks in lower case, as the letters they stand for.
 def verifyWord(word, game):
-    dict = open(game.dictionary, 'r')
-    for line in dict:
-        if word == line.rstrip():
-            dict.close()
-            return True
-    dict.close()
-    return False
+    return game.lexicon.contains(word.upper())
 
 # Compares two squares by x coordinate
 def compareX(sq1, sq2):
@@ -263,9 +409,5 @@ def compareY(sq1, sq2):
 # Check if there exists a path between two squares such that each tile
 # on the path is occupied
 def existsPath(sq1, sq2, board):
-    for x in range(min(sq1.x, sq2.x), max(sq1.x, sq2.x) + 1):
-        for y in range(min(sq1.y, sq2.y), max(sq1.y, sq2.y) + 1):
-            if board.squares[(x, y)].letter is None:
-                return False
-    return True
-
+    return board.isFilled(min(sq1.x, sq2.x), min(sq1.y, sq2.y),
+            max(sq1.x, sq2.x), max(sq1.y, sq2.y))
@@ -1,9 +1,14 @@
 #!/usr/bin/python
 
 import curses
-import random
 import Display
 import sys
+import time
+import debug
+import zobrist
+import Play
+from letters import BLANK, tileFor
+from Lexicon import letterBit, ALL_LETTERS
 from constants import *
 
 #### This class represents a Scrabble player.
@@ -12,7 +17,9 @@ class Player:
         self.name = name
         self.score = 0
         self.rack = []
+        self.rackHash = 0 # Zobrist hash of the tiles on the rack
         self.used = [] # Squares a player is using this turn (not exchanging)
+        self.preview = Play.Preview() # Words and score of the tiles in used
         self.exchanged = [] # Letters a player is exchanging this turn
         # This variable is true if it is the start of the player's turn (real
         # turn, not game "turn.")  Players take extra "turns" if they (for instance)
@@ -23,32 +30,100 @@ class Player:
         self.canChallenge = True
     
     def addToRack(self, game, letter):
-        self.rack.append(letter)
+        self.putOnRack(letter)
         game.display.redrawRack(self)
     
     def removeFromRack(self, game, letter):
-        self.rack.remove(letter)
+        self.takeOffRack(letter)
         game.display.redrawRack(self)
 
+    # Adds a tile to the rack without redrawing it.  Every change to the
+    # rack goes through here or takeOffRack, which keep rackHash up to date.
+    def putOnRack(self, letter):
+        self.rackHash ^= zobrist.rackKeys[0][letter][self.rack.count(letter)]
+        self.rack.append(letter)
+
+    def takeOffRack(self, letter):
+        self.rack.remove(letter)
+        self.rackHash ^= zobrist.rackKeys[0][letter][self.rack.count(letter)]
+
     def addToUsed(self, game, square):
         self.used.append(square)
-        game.display.clearMsg()
-        game.display.printMsg("Letters used: " + \
-                "".join([tile.letter for tile in self.used]))
+        self.preview.add(square.x, square.y)
+        self.showUsed(game)
 
     def removeFromUsed(self, game, square):
         self.used.remove(square)
+        self.preview.remove(square.x, square.y)
+        self.showUsed(game)
+
+    # Takes every square out of used, once the tiles are played or recalled
+    def clearUsed(self):
+        self.used = []
+        self.preview.clear()
+
+    # Shows the letters used this turn, and below them the words they make
+    # and what they would score
+    def showUsed(self, game):
         game.display.clearMsg()
         game.display.printMsg("Letters used: " + \
                 "".join([tile.letter for tile in self.used]))
+        game.display.printMsg(self.preview.describe(game,
+                SCRSIZE_X - MSG_X - 1), 1)
+
+    # Asks which letter a blank going on a square stands for.  Returns the
+    # letter in lower case, or None if the player cancels.  The letters
+    # that would make words with the tiles beside the square are listed;
+    # each direction is one pattern query on the word graph (see
+    # Lexicon.crossCheck).
+    def chooseBlank(self, game, square):
+        display = game.display
+        display.clearMsg()
+        display.printMsg("Blank as which letter? (Esc cancels)")
+        fits = ALL_LETTERS
+        neighbours = False
+        for dx, dy in ((1, 0), (0, 1)):
+            before, after = game.board.lettersBeside(square.x, square.y,
+                    dx, dy)
+            if before or after:
+                neighbours = True
+                fits &= game.lexicon.crossCheck(before.upper(),
+                        after.upper())
+        if neighbours:
+            display.printMsg("Makes words here: " + "".join([letter
+                    for letter in sorted(letterBit.keys())
+                    if fits & letterBit[letter]]), 1)
+        while 1:
+            c = display.getch()
+            if c == KEY_ESC or c == KEY_EOF:
+                self.showUsed(game)
+                return None
+            if 0 <= c < 256 and chr(c).isalpha():
+                return chr(c).lower()
+
+    # Asks whether to challenge the play with which another player went
+    # out.  Returns True to challenge it.
+    def wantsChallenge(self, game, outPlayer):
+        display = game.display
+        display.drawStatus(game)
+        display.clearMsg()
+        display.printMsg(outPlayer.name + " went out.  Challenge? (y/n)")
+        while 1:
+            c = display.getch()
+            if c == KEY_Y:
+                return True
+            if c == KEY_N or c == KEY_NEWLINE or c == KEY_ESC or \
+                    c == KEY_EOF:
+                return False
 
     def drawTiles(self, game):
         # Draw tiles from bag
+        drawn = []
         while len(self.rack) < 7 and len(game.bag) > 0:
-            tile = random.choice(game.bag)
-            self.addToRack(game, tile)
-#            self.rack.append(tile)
-            game.bag.remove(tile)
+            drawn.append(game.bag.draw())
+            self.addToRack(game, drawn[-1])
+        if game.journal is not None and drawn:
+            game.journal.draw(self, drawn)
         game.display.redrawRack(self)
         
 
@@ -58,6 +133,11 @@ class Player:
         if self.newTurn is True:
             self.drawTiles(game)
             self.canChallenge = True
+        if debug.level >= debug.INFO:
+            turnStart = time.time()
+            debug.log(debug.INFO, "turn", turn=game.turnNumber,
+                    player=self.name, newTurn=self.newTurn,
+                    rack="".join(self.rack))
 
         # Refresh display
         display = game.display
@@ -67,17 +147,23 @@ class Player:
 
         while 1:
             # Get input
-            scr = display.stdscr
-            c = scr.getch()
-            position = scr.getyx()
-            x = position[1]
-            y = position[0]
+            c = display.getch()
+            x, y = display.getCursor()
             
+            # Out of input: nothing more can happen, so end the game
+            if c == KEY_EOF:
+                game.endGame()
+                break
+
             # Submit command
-            if c == KEY_NEWLINE:
-                if game.board.onBoard(x, y):
-                    game.submitButton.click(game, self)
-                elif game.submitButton.onButton(x, y):
+            elif c == KEY_NEWLINE:
+                if game.board.onBoard(x, y) or \
+                        game.submitButton.onButton(x, y):
+                    if debug.level >= debug.INFO:
+                        debug.log(debug.INFO, "submit", turn=game.turnNumber,
+                                player=self.name,
+                                squares=debug.squares(self.used),
+                                seconds=round(time.time() - turnStart, 3))
                     game.submitButton.click(game, self)
                 elif game.passButton.onButton(x, y):
                     game.passButton.click(game, self)
@@ -89,6 +175,10 @@ class Player:
                     game.quitButton.click(game, self)
                 elif game.shuffleButton.onButton(x, y):
                     game.shuffleButton.click(game, self)
+                elif game.hintButton.onButton(x, y):
+                    game.hintButton.click(game, self)
+                elif game.undoButton.onButton(x, y):
+                    game.undoButton.click(game, self)
                 else:
                     continue
                 break # Ends turn; some buttons let you take another turn
@@ -132,7 +222,7 @@ class Player:
                     # Add tile to rack, removing it from board
                     self.removeFromUsed(game, square)
 #                    self.used.remove(square)
-                    self.addToRack(game, square.letter)
+                    self.addToRack(game, tileFor(square.letter))
 #                    self.rack.append(square.letter)
                     game.board.changeLetter(square.x, square.y, None)
                     # Update display
@@ -146,21 +236,32 @@ class Player:
             # Shuffle the rack
             elif c == KEY_SPACE or c == KEY_S:
                 game.shuffleButton.click(game, self)
+                break # The button gives the player another turn
             
+            # Show the best plays
+            elif c == KEY_QUESTION:
+                game.hintButton.click(game, self)
+                break
+
             # Quit the game
             elif c == KEY_Q and not game.board.onBoard(x, y):
                 game.quitButton.click(game, self)
                 break
             
             # Add tiles
-            elif game.board.onBoard(x, y) and not game.board.squares[(x, y)].isOccupied():
-                square = game.board.squares[(x, y)]
-                if chr(c) in self.rack:
+            elif game.board.onBoard(x, y) and not game.board.square(x, y).isOccupied():
+                square = game.board.square(x, y)
+                letter = None
+                if c == ord(BLANK) and BLANK in self.rack:
+                    letter = self.chooseBlank(game, square)
+                elif 0 <= c < 256 and chr(c) in self.rack:
+                    letter = chr(c)
+                if letter is not None:
                     # Add tile to board
 #                    self.rack.remove(chr(c))
-                    game.board.changeLetter(square.x, square.y, chr(c))
+                    game.board.changeLetter(square.x, square.y, letter)
                     self.addToUsed(game, square)
-                    self.removeFromRack(game, chr(c))
+                    self.removeFromRack(game, tileFor(letter))
 #                    self.used.append(square)
 
                     # Update display
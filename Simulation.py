@@ -0,0 +1,202 @@
+#!/usr/bin/python
+
+# Monte Carlo simulation for choosing between candidate moves.  The score
+# of a move says nothing about what it leaves on the rack or opens up for
+# the opponent, so instead each candidate is played out many times: the
+# opponent gets a random rack drawn from the unseen tiles (the bag plus the
+# other players' racks, as seen by the player to move), both sides refill
+# from the rest, and each side plays its highest-scoring move for a few
+# plies.  A candidate's equity is its average spread (its own points minus
+# the opponent's) over those playouts.
+#
+# Candidates are simulated in rounds.  After each round, any candidate
+# whose equity is clearly below the best one's (the confidence intervals
+# don't overlap) is dropped, so the time goes to the close calls.  Every
+# candidate sees the same opponent racks in the same iteration, which
+# makes the differences between them much less noisy.
+#
+# Playouts can be spread over the worker processes of MoveGen's pool.
+#
+# A playout costs a search for the best move in each ply after the
+# candidate.  The last ply only needs the move's score, so it uses
+# MoveGen.bestScore, which builds no moves.  Even so, a playout takes
+# about 20 ms on one CPU, and much longer when the rack holds a blank.
+# So 1000 playouts for each of 10 candidates takes minutes, not seconds,
+# unless the pruning stops it early.  "python benchmark.py simulate"
+# gives the rate.  To answer within a few seconds, pass a timeLimit, and
+# the candidates get however many playouts fit in it.
+
+import math
+import random
+import time
+import multiprocessing
+import TileBag
+import MoveGen
+from letters import tileFor
+import GameState
+
+# Default number of playouts per candidate
+ITERATIONS = 1000
+
+# Default number of plies played, counting the candidate itself: 2 is the
+# candidate and the opponent's reply
+PLIES = 2
+
+# Playouts per candidate in each round
+ROUND = 50
+
+# Candidates are compared after this many playouts each, not before
+MIN_ITERATIONS = 100
+
+# Width of the confidence interval in standard errors (1.96 is 95%)
+CONFIDENCE = 1.96
+
+# This class holds the results of simulating one candidate move.
+class Candidate:
+    def __init__(self, move):
+        self.move = move
+        self.iterations = 0
+        self.total = 0.0
+        self.totalSquares = 0.0
+        self.pruned = False # Dropped as clearly worse than another move
+
+    def addSpreads(self, spreads):
+        for spread in spreads:
+            self.total += spread
+            self.totalSquares += spread * spread
+        self.iterations += len(spreads)
+
+    # Average spread over the playouts so far
+    def equity(self):
+        if self.iterations == 0:
+            return 0.0
+        return self.total / self.iterations
+
+    # Half the width of the confidence interval around the equity
+    def margin(self):
+        if self.iterations < 2:
+            return float("inf")
+        mean = self.equity()
+        variance = (self.totalSquares - self.iterations * mean * mean) / \
+                (self.iterations - 1)
+        return CONFIDENCE * math.sqrt(max(variance, 0.0) / self.iterations)
+
+    def __repr__(self):
+        return "<Candidate %s: %.1f +/- %.1f over %d>" % (self.move,
+                self.equity(), self.margin(), self.iterations)
+
+# Returns the tiles the player can't see: the bag and everyone else's racks
+def unseenTiles(game, player):
+    tiles = game.bag.tiles()
+    for other in game.roster:
+        if other is not player:
+            tiles.extend(other.rack)
+    return tiles
+
+# Simulates candidate moves (from MoveGen) for the player to move.  Returns
+# a list of Candidates, highest equity first.  Stops after iterations
+# playouts per candidate, when one candidate is clearly best, or when
+# timeLimit seconds have passed.  processes is the number of worker
+# processes to use (by default, one per CPU); with 1, everything runs in
+# this process.
+def simulate(game, player, moves, iterations=ITERATIONS, plies=PLIES,
+        timeLimit=None, processes=None, seed=None):
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if timeLimit is not None:
+        deadline = time.time() + timeLimit
+    candidates = [Candidate(move) for move in moves]
+    unseen = TileBag.TileBag({})
+    unseen.addTiles(unseenTiles(game, player))
+    if seed is None:
+        seed = random.getrandbits(32)
+
+    # The board after each candidate, sent to the worker processes as its
+    # letters
+    boards = []
+    for move in moves:
+        state = game.snapshot(player)
+        state.apply(move, False)
+        boards.append(state.board)
+
+    done = 0
+    while done < iterations:
+        live = [i for i in range(len(candidates))
+                if not candidates[i].pruned]
+        if len(live) <= 1 and done > 0:
+            break
+        seeds = [seed + iteration
+                for iteration in range(done, min(done + ROUND, iterations))]
+        tasks = []
+        for i in live:
+            leave = list(player.rack)
+            for x, y, letter in candidates[i].move.tiles:
+                leave.remove(tileFor(letter))
+            tasks.append((str(boards[i].letters), leave, unseen.counts,
+                    plies, seeds))
+        if processes == 1:
+            results = [playOuts(boards[i], game.lexicon, task)
+                    for i, task in zip(live, tasks)]
+        else:
+            results = MoveGen.getPool(game.lexicon, processes).map(
+                    simulateBatch, tasks, 1)
+        for i, spreads in zip(live, results):
+            candidates[i].addSpreads([candidates[i].move.score + spread
+                    for spread in spreads])
+        done += len(seeds)
+        if done >= MIN_ITERATIONS:
+            prune(candidates)
+        if timeLimit is not None and time.time() > deadline:
+            break
+
+    candidates.sort(key=lambda candidate: -candidate.equity())
+    return candidates
+
+# Drops the candidates whose confidence interval lies wholly below the best
+# candidate's
+def prune(candidates):
+    live = [candidate for candidate in candidates if not candidate.pruned]
+    best = max(live, key=lambda candidate: candidate.equity())
+    floor = best.equity() - best.margin()
+    for candidate in live:
+        if candidate.equity() + candidate.margin() < floor:
+            candidate.pruned = True
+
+# Runs in a worker process: plays out one candidate from a batch of seeds.
+# task is (boardLetters, leave, unseenCounts, plies, seeds), where
+# boardLetters is the board after the candidate as a string.
+def simulateBatch(task):
+    board = MoveGen.workerBoardFor(task[0])
+    return playOuts(board, MoveGen.workerLexicon, task)
+
+# Plays out the position on a board (after the candidate) once for each
+# seed, and returns the spread after each playout, not counting the
+# candidate's own score
+def playOuts(board, lexicon, task):
+    boardLetters, leave, unseenCounts, plies, seeds = task
+    unseen = TileBag.TileBag({})
+    unseen.counts = list(unseenCounts)
+    unseen.total = sum(unseenCounts)
+    spreads = []
+    for seed in seeds:
+        bag = unseen.copy()
+        bag.seed(seed)
+        spreads.append(playOut(board, lexicon, leave, bag, plies))
+    return spreads
+
+# Plays the highest-scoring move for each side in turn, opponent first,
+# for plies - 1 moves.  The board isn't changed.  Returns the player's
+# points minus the opponent's.
+def playOut(board, lexicon, leave, bag, plies):
+    racks = [bag.drawTiles(7), leave + bag.drawTiles(7 - len(leave))]
+    state = GameState.GameState(board, bag, racks, [0, 0])
+    state.ownsBag = True # The bag is this playout's own copy
+    for ply in range(1, plies):
+        if ply < plies - 1:
+            state.apply(MoveGen.bestMove(state.board, state.rack(), lexicon))
+        else:
+            # The last move needn't be put on the board, so only its score
+            # is worked out
+            state.scores[state.toMove] += MoveGen.bestScore(state.board,
+                    state.rack(), lexicon) or 0
+    return state.scores[1] - state.scores[0]
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+# This class represents the bag of tiles.  Instead of a list of tiles, the
+# bag keeps a count of each kind of tile (26 letters and the blank), so a
+# draw picks a slot with probability proportional to its count without
+# searching or shuffling a list, and copying a bag is copying 27 numbers.
+#
+# Each bag has its own random number generator.  Seeding it (or restoring
+# its state with setState) makes every later draw repeat exactly.
+
+import random
+import letters
+
+# Tile in each slot of the bag
+SLOTS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ."
+slotOf = dict([(SLOTS[i], i) for i in range(len(SLOTS))])
+
+class TileBag:
+    def __init__(self, frequency=letters.frequency, seed=None):
+        self.counts = [0] * len(SLOTS)
+        for tile in frequency.keys():
+            self.counts[slotOf[tile]] = frequency[tile]
+        self.total = sum(self.counts)
+        self.rng = random.Random(seed)
+
+    # Returns an independent copy of the bag, including the state of its
+    # random number generator
+    def copy(self):
+        bag = TileBag({})
+        bag.counts = list(self.counts)
+        bag.total = self.total
+        bag.rng.setstate(self.rng.getstate())
+        return bag
+
+    def seed(self, seed):
+        self.rng.seed(seed)
+
+    # Returns everything needed to put the bag back as it is now
+    def getState(self):
+        return (tuple(self.counts), self.rng.getstate())
+
+    def setState(self, state):
+        counts, rngState = state
+        self.counts = list(counts)
+        self.total = sum(self.counts)
+        self.rng.setstate(rngState)
+
+    # Takes a random tile out of the bag
+    def draw(self):
+        assert self.total > 0, "Bag is empty"
+        pick = self.rng.randrange(self.total)
+        counts = self.counts
+        slot = 0
+        while pick >= counts[slot]:
+            pick -= counts[slot]
+            slot += 1
+        counts[slot] -= 1
+        self.total -= 1
+        return SLOTS[slot]
+
+    # Takes up to n random tiles out of the bag
+    def drawTiles(self, n):
+        return [self.draw() for i in range(min(n, self.total))]
+
+    # Puts a tile back in the bag
+    def add(self, tile):
+        self.counts[slotOf[tile]] += 1
+        self.total += 1
+
+    def addTiles(self, tiles):
+        for tile in tiles:
+            self.add(tile)
+
+    # Takes a particular tile out of the bag
+    def remove(self, tile):
+        slot = slotOf[tile]
+        assert self.counts[slot] > 0, "No " + tile + " in bag"
+        self.counts[slot] -= 1
+        self.total -= 1
+
+    def count(self, tile):
+        return self.counts[slotOf[tile]]
+
+    # Returns a list of every tile in the bag
+    def tiles(self):
+        tiles = []
+        for slot in range(len(SLOTS)):
+            tiles.extend([SLOTS[slot]] * self.counts[slot])
+        return tiles
+
+    def __len__(self):
+        return self.total
@@ -0,0 +1,438 @@
+#!/usr/bin/python
+
+# Timing benchmarks for the game engine.  Run "python benchmark.py -h" for
+# the list of benchmarks.
+
+import os
+import sys
+import time
+import random
+import multiprocessing
+from optparse import OptionParser
+import Lexicon
+import letters
+import Game
+import MoveGen
+import Simulation
+import Endgame
+import zobrist
+import History
+from constants import BOARDSIZE_X, BOARDSIZE_Y
+import TileBag
+
+# Number of times each board is timed by the movegen benchmark
+MOVEGEN_RUNS = 3
+
+# Times a function call, returning (seconds, result)
+def timeCall(function, *args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+# Compares loading a word list with and without a compiled cache
+def benchStartup(opts):
+    filename = opts.dictionary
+    cacheFile = filename + Lexicon.CACHE_SUFFIX
+    words = Lexicon.readWords(filename)
+
+    parseTime, lexicon = timeCall(Lexicon.Lexicon, filename, False)
+    if os.path.exists(cacheFile):
+        os.remove(cacheFile)
+    coldTime, lexicon = timeCall(Lexicon.Lexicon, filename)
+    warmTime, lexicon = timeCall(Lexicon.Lexicon, filename)
+
+    lookupTime, found = timeCall(lambda: [lexicon.contains(word)
+            for word in words])
+    assert all(found), "Cached lexicon is missing words"
+
+    print "Word list:          %s (%d words)" % (filename, len(lexicon))
+    print "Parse word list:    %8.1f ms" % (parseTime * 1000)
+    print "Cold (build cache): %8.1f ms" % (coldTime * 1000)
+    print "Warm (map cache):   %8.1f ms" % (warmTime * 1000)
+    print "Lookups:            %8.2f us/word" % \
+            (lookupTime * 1e6 / len(words))
+
+# Returns a shuffled list of every tile in the game
+def shuffledTiles(rng):
+    tiles = []
+    for letter in sorted(letters.frequency.keys()):
+        tiles.extend([letter] * letters.frequency[letter])
+    rng.shuffle(tiles)
+    return tiles
+
+# Plays the best-scoring move for a few turns from an empty board.
+# Returns the board and the tiles left over.
+def midGameBoard(lexicon, turns, seed):
+    rng = random.Random(seed)
+    board = Game.Board(lexicon)
+    tiles = shuffledTiles(rng)
+    for turn in range(turns):
+        rack = tiles[:7]
+        moves = MoveGen.allMoves(board, rack, lexicon)
+        if len(moves) == 0:
+            continue
+        for x, y, letter in moves[0].tiles:
+            board.changeLetter(x, y, letter)
+            rack.remove(letters.tileFor(letter))
+        tiles = rack + tiles[7:]
+        rng.shuffle(tiles)
+    return board, tiles
+
+# Plays the best-scoring move from an empty board until only two racks'
+# worth of tiles are left.  Returns the board and the two racks.
+def endgameBoard(lexicon, seed):
+    rng = random.Random(seed)
+    board = Game.Board(lexicon)
+    tiles = shuffledTiles(rng)
+    while len(tiles) > 14:
+        rack = tiles[:7]
+        moves = MoveGen.allMoves(board, rack, lexicon)
+        if len(moves) == 0:
+            rng.shuffle(tiles)
+            continue
+        for x, y, letter in moves[0].tiles:
+            board.changeLetter(x, y, letter)
+            rack.remove(letters.tileFor(letter))
+        tiles = rack + tiles[7:]
+        rng.shuffle(tiles)
+    return board, [tiles[:7], tiles[7:]]
+
+# Times generating every move for a rack on mid-game boards.  Each board
+# is timed as the best of a few runs, so that a pause in the machine
+# doesn't count against it, and the benchmark fails if the slowest board
+# takes longer than the bound.
+def benchMoveGen(opts):
+    lexicon = Lexicon.Lexicon(opts.dictionary)
+    lexicon.getDawg()
+    lexicon.getGaddag()
+    times = []
+    counts = []
+    for seed in range(opts.boards):
+        board, tiles = midGameBoard(lexicon, opts.turns, seed)
+        rack = tiles[:7]
+        best = None
+        for run in range(MOVEGEN_RUNS):
+            elapsed, moves = timeCall(MoveGen.allMoves, board, rack, lexicon)
+            best = min(best, elapsed) if best is not None else elapsed
+        times.append((best, "".join(rack)))
+        counts.append(len(moves))
+    times.sort()
+    worst, worstRack = times[-1]
+    print "Boards:             %d, after %d turns each" % \
+            (opts.boards, opts.turns)
+    print "Moves per rack:     %8.1f" % (float(sum(counts)) / len(counts))
+    print "Median:             %8.1f ms" % (times[len(times) / 2][0] * 1000)
+    print "Worst:              %8.1f ms (%s)" % (worst * 1000, worstRack)
+    assert worst * 1000 <= opts.bound, \
+            "Generating moves for %s took %.1f ms, over the %.1f ms bound" % \
+            (worstRack, worst * 1000, opts.bound)
+
+# Compares generating moves in one process with generating them in pools
+# of worker processes of different sizes
+def benchParallel(opts):
+    lexicon = Lexicon.Lexicon(opts.dictionary)
+    lexicon.getDawg()
+    positions = []
+    for seed in range(opts.boards):
+        board, tiles = midGameBoard(lexicon, opts.turns, seed)
+        positions.append((board, tiles[:7]))
+
+    def run(processes):
+        if processes is None:
+            return [MoveGen.allMoves(board, rack, lexicon)
+                    for board, rack in positions]
+        return [MoveGen.allMovesParallel(board, rack, lexicon, processes)
+                for board, rack in positions]
+
+    baseTime, expected = timeCall(run, None)
+    print "CPUs:               %d" % multiprocessing.cpu_count()
+    print "Single process:     %8.1f ms/rack" % \
+            (baseTime * 1000 / len(positions))
+    processes = 1
+    while processes <= opts.processes:
+        run(processes) # Start the pool and warm up the workers
+        elapsed, found = timeCall(run, processes)
+        for moves, expectedMoves in zip(found, expected):
+            assert len(moves) == len(expectedMoves), \
+                    "Parallel generator found different moves"
+        print "%2d processes:       %8.1f ms/rack (%.2fx)" % (processes,
+                elapsed * 1000 / len(positions), baseTime / elapsed)
+        processes *= 2
+    MoveGen.closePool()
+
+# Times simulating the best-scoring candidate moves on a mid-game board,
+# using every CPU
+def benchSimulate(opts):
+    game = Game.Game(opts.intl, False, headless=True, names=["A", "B"])
+    board, tiles = midGameBoard(game.lexicon, opts.turns, 0)
+    game.board = board
+    game.bag = TileBag.TileBag({})
+    game.bag.addTiles(tiles[14:])
+    player, opponent = game.roster
+    player.rack = tiles[:7]
+    opponent.rack = tiles[7:14]
+    moves = MoveGen.allMoves(board, player.rack, game.lexicon)
+    moves = moves[:opts.candidates]
+
+    elapsed, results = timeCall(Simulation.simulate, game, player, moves,
+            opts.iterations, Simulation.PLIES, None, None, 0)
+    MoveGen.closePool()
+    playouts = sum([candidate.iterations for candidate in results])
+    print "CPUs:               %d" % multiprocessing.cpu_count()
+    print "Candidates:         %d, up to %d playouts each" % \
+            (len(moves), opts.iterations)
+    print "Playouts:           %d" % playouts
+    print "Time:               %8.2f s" % elapsed
+    print "Rate:               %8.1f playouts/s" % (playouts / elapsed)
+    for candidate in results[:3]:
+        print "  %-30s %6.1f +/- %.1f" % (candidate.move, candidate.equity(),
+                candidate.margin())
+
+# Times searching endgames, each for up to a second
+def benchEndgame(opts):
+    lexicon = Lexicon.Lexicon(opts.dictionary)
+    lexicon.getDawg()
+    for seed in range(opts.boards):
+        board, racks = endgameBoard(lexicon, seed)
+        solver = Endgame.Solver(board, racks, lexicon)
+        elapsed, result = timeCall(solver.solve, Endgame.TIME_LIMIT)
+        print "%-8s %-8s %3d plies%s, %+4d, %6d positions, %6.2f s" % \
+                ("".join(racks[0]), "".join(racks[1]), result.depth,
+                result.exact and " (exact)" or "        ", result.value,
+                result.positions, elapsed)
+
+# Returns a random position for the hashing benchmark, as (tiles, rack,
+# player), where tiles is a sorted list of (square, letter)
+def randomPosition(rng):
+    tiles = {}
+    for i in range(rng.randrange(100)):
+        tiles[rng.randrange(BOARDSIZE_X * BOARDSIZE_Y)] = \
+                chr(ord('A') + rng.randrange(26))
+    rack = sorted([chr(ord('A') + rng.randrange(26)) for i in range(7)])
+    return sorted(tiles.items()), rack, rng.randrange(2)
+
+def positionHash(position):
+    tiles, rack, player = position
+    key = zobrist.rackHash(rack, 0) ^ zobrist.turnKeys[player]
+    for square, letter in tiles:
+        key ^= zobrist.squareKeys[square][letter]
+    return key
+
+# Checks that the hashes kept by the board and racks match ones worked out
+# from scratch, then hashes random positions and counts the ones that hash
+# the same as a different position
+def benchZobrist(opts):
+    game = Game.Game(opts.intl, False, headless=True, names=["A", "B"])
+    game.lexicon.getDawg()
+    for seed in range(opts.boards):
+        board, tiles = midGameBoard(game.lexicon, opts.turns, seed)
+        assert board.hash == zobrist.boardHash(board), "Board hash is wrong"
+        for square in board.occupiedSquares()[::2]:
+            board.changeLetter(square.x, square.y, None)
+        assert board.hash == zobrist.boardHash(board), "Board hash is wrong"
+    player = game.roster[0]
+    for tile in "QUEUE":
+        player.putOnRack(tile)
+    player.takeOffRack("U")
+    assert player.rackHash == zobrist.rackHash(player.rack, 0), \
+            "Rack hash is wrong"
+    print "Incremental hashes: match"
+
+    rng = random.Random()
+    seen = {} # Hash -> number of the position
+    collisions = 0
+    start = time.time()
+    for i in range(opts.positions):
+        rng.seed(i)
+        position = randomPosition(rng)
+        key = positionHash(position)
+        if key in seen:
+            rng.seed(seen[key])
+            if randomPosition(rng) != position:
+                collisions += 1
+        else:
+            seen[key] = i
+    elapsed = time.time() - start
+    print "Random positions:   %d (%d distinct hashes) in %.1f s" % \
+            (opts.positions, len(seen), elapsed)
+    print "Collisions:         %d" % collisions
+
+# The parts of a game that undo and redo put back
+def gameState(game):
+    return (str(game.board.letters), game.board.hash,
+            [(sorted(player.rack), player.rackHash, player.score)
+            for player in game.roster], list(game.bag.counts),
+            len(game.plays), History.turnOf(game),
+            game.bag.rng.getstate())
+
+# Plays games between computer players, then times stepping back through
+# each one to the start with undo and forwards to the end with redo,
+# checking the game is as it was after every turn on the way
+def benchUndo(opts):
+    undoTimes = []
+    redoTimes = []
+    for seed in range(opts.boards):
+        game = Game.Game(opts.intl, False, True, ["A", "B"], seed, 2)
+        for player in game.roster:
+            player.endgameTime = None
+        states = [gameState(game)]
+        while not game.gameOver:
+            game.playTurn()
+            if game.history.undone and \
+                    gameState(game) != states[-1]:
+                states.append(gameState(game))
+        history = game.history
+        steps = len(history.undone)
+        assert steps == len(states) - 1, "Turns missing from the history"
+        start = time.time()
+        while history.undo() is not None:
+            pass
+        undoTimes.append((time.time() - start) / steps)
+        assert gameState(game) == states[0], "Undo didn't reach the start"
+        start = time.time()
+        while history.redo() is not None:
+            pass
+        redoTimes.append((time.time() - start) / steps)
+        assert gameState(game) == states[-1], "Redo didn't reach the end"
+        for state in reversed(states[:-1]):
+            history.undo()
+            assert gameState(game) == state, "Undo went to the wrong turn"
+    undoTimes.sort()
+    redoTimes.sort()
+    print "Games:              %d" % opts.boards
+    print "Undo:               %8.1f us/turn (median)" % \
+            (undoTimes[len(undoTimes) / 2] * 1e6)
+    print "Redo:               %8.1f us/turn (median)" % \
+            (redoTimes[len(redoTimes) / 2] * 1e6)
+
+# Written to the terminal between turns by the render benchmark, so the
+# bytes of each turn can be told apart
+RENDER_MARK = "\0\0TURN\0\0"
+
+# Stands in for the curses screen, counting the cells drawn on it
+class CountingScreen:
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.cells = 0
+
+    def addstr(self, y, x, text, attr=0):
+        self.cells += len(text)
+        return self.stdscr.addstr(y, x, text, attr)
+
+    def __getattr__(self, name):
+        return getattr(self.stdscr, name)
+
+# Plays the best-scoring move for each turn through a curses display,
+# drawing what a player's keypresses would: each tile going down, the
+# preview, the rack, the score.  Runs in a child process on a pseudo-
+# terminal; RENDER_MARK is written after each turn.  Returns the number of
+# cells handed to curses per turn.
+def renderGame(opts):
+    game = Game.Game(opts.intl, False, names=["A", "B"], seed=0)
+    display = game.display
+    display.stdscr = CountingScreen(display.stdscr)
+    display.drawScreen(game)
+    display.update()
+    os.write(sys.stdout.fileno(), RENDER_MARK)
+    cellsBefore = display.stdscr.cells
+    for turn in range(opts.turns):
+        player = game.players.popleft()
+        game.players.append(player)
+        game.curPlayer = player
+        player.drawTiles(game)
+        display.drawStatus(game)
+        moves = MoveGen.allMoves(game.board, player.rack, game.lexicon)
+        if len(moves) > 0:
+            for x, y, letter in moves[0].tiles:
+                game.board.changeLetter(x, y, letter)
+                player.addToUsed(game, game.board.square(x, y))
+                player.removeFromRack(game, letters.tileFor(letter))
+                display.redrawSquare(x, y, game.board)
+                display.moveCursor(x + 1, y)
+                display.update()
+            game.submitButton.click(game, player)
+        display.drawStatus(game)
+        display.update()
+        os.write(sys.stdout.fileno(), RENDER_MARK)
+    cells = display.stdscr.cells - cellsBefore
+    display.close()
+    return float(cells) / max(opts.turns, 1)
+
+# Counts the cells drawn and the bytes written to the terminal per turn,
+# with and without comparing drawing against the display's shadow of the
+# screen
+def benchRender(opts):
+    import pty
+    import fcntl
+    import termios
+    import struct
+    import Display
+    for diff in (False, True):
+        reader, writer = os.pipe()
+        pid, terminal = pty.fork()
+        if pid == 0:
+            os.close(reader)
+            os.environ["TERM"] = "xterm"
+            fcntl.ioctl(sys.stdout.fileno(), termios.TIOCSWINSZ,
+                    struct.pack("HHHH", 24, 80, 0, 0))
+            Display.DIFF_RENDERING = diff
+            cells = renderGame(opts)
+            os.write(writer, "%f" % cells)
+            os._exit(0)
+        os.close(writer)
+        output = []
+        while 1:
+            try:
+                data = os.read(terminal, 65536)
+            except OSError: # The child closed the terminal
+                break
+            if data == "":
+                break
+            output.append(data)
+        os.waitpid(pid, 0)
+        cells = float(os.read(reader, 64) or "0")
+        os.close(reader)
+        os.close(terminal)
+        turns = "".join(output).split(RENDER_MARK)[1:-1]
+        sizes = [len(turn) for turn in turns]
+        print "%-20s%8.1f cells/turn, %8.1f bytes/turn (%d turns)" % \
+                (diff and "Shadow diffing:" or "Direct drawing:", cells,
+                float(sum(sizes)) / max(len(sizes), 1), len(sizes))
+
+benchmarks = { "startup": benchStartup, "movegen": benchMoveGen,
+        "parallel": benchParallel, "simulate": benchSimulate,
+        "endgame": benchEndgame, "zobrist": benchZobrist,
+        "render": benchRender, "undo": benchUndo }
+
+if __name__ == "__main__":
+    parser = OptionParser(usage="%prog [options] benchmark...\n\n" + \
+            "Benchmarks: " + ", ".join(sorted(benchmarks.keys())))
+    parser.add_option("-i", "--intl", action="store_true", dest="intl",
+            default=False, help="Use the international dictionary")
+    parser.add_option("-b", "--boards", type="int", dest="boards",
+            default=20, help="Number of boards to generate moves on")
+    parser.add_option("-t", "--turns", type="int", dest="turns",
+            default=8, help="Number of turns played on each board")
+    parser.add_option("-p", "--processes", type="int", dest="processes",
+            default=8, help="Largest pool of worker processes to try")
+    parser.add_option("-n", "--iterations", type="int", dest="iterations",
+            default=Simulation.ITERATIONS,
+            help="Most playouts per candidate move when simulating")
+    parser.add_option("--positions", type="int", dest="positions",
+            default=1000000, help="Number of random positions to hash")
+    parser.add_option("--candidates", type="int", dest="candidates",
+            default=10, help="Number of candidate moves to simulate")
+    parser.add_option("--bound", type="float", dest="bound", default=50.0,
+            help="Most milliseconds the movegen benchmark allows a board")
+    (opts, args) = parser.parse_args()
+    if opts.intl:
+        opts.dictionary = "sowpods.txt"
+    else:
+        opts.dictionary = "TWL06.txt"
+    if len(args) == 0:
+        args = sorted(benchmarks.keys())
+    for name in args:
+        if name not in benchmarks:
+            sys.exit("Unknown benchmark: " + name)
+        print "== " + name + " =="
+        benchmarks[name](opts)
@@ -73,5 +73,14 @@ for x in range(BOARDSIZE_X):
         if (x, y) not in bonuses.keys():
             bonuses[(x, y)] = "N"
 
+# Bonus of each square, indexed by y*15+x
+squareBonus = [bonuses[(i % BOARDSIZE_X, i / BOARDSIZE_X)]
+        for i in range(BOARDSIZE_X * BOARDSIZE_Y)]
+
 # Bonus square colors
 colors = { "N": BKGROUND, "DL": DL, "TL": TL, "DW": DW, "TW": TW }
+
+# How much each kind of square multiplies a new tile's score, and the score
+# of every word through a new tile
+letterMultiplier = { "N": 1, "DL": 2, "TL": 3, "DW": 1, "TW": 1 }
+wordMultiplier = { "N": 1, "DL": 1, "TL": 1, "DW": 2, "TW": 3 }
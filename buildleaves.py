@@ -0,0 +1,44 @@
+#!/usr/bin/python
+
+# Builds the leave table for a word list from self-play (see Leaves.py).
+# Run "python buildleaves.py -h" for the options.
+
+import time
+from optparse import OptionParser
+import Lexicon
+import Leaves
+
+if __name__ == "__main__":
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-i", "--intl", action="store_true", dest="intl",
+            default=False, help="Use the international dictionary")
+    parser.add_option("-g", "--games", type="int", dest="games",
+            default=500, help="Number of self-play games to learn from")
+    parser.add_option("--seed", type="int", dest="seed", default=None,
+            help="Seed for the self-play games")
+    (opts, args) = parser.parse_args()
+    if opts.intl:
+        dictionary = "sowpods.txt"
+    else:
+        dictionary = "TWL06.txt"
+    lexicon = Lexicon.Lexicon(dictionary)
+    lexicon.getDawg()
+
+    start = time.time()
+    stats, average = Leaves.selfPlay(lexicon, opts.games, opts.seed)
+    print "Self-play:          %d games in %.1f s" % (opts.games,
+            time.time() - start)
+    print "Leaves seen:        %d" % len(stats)
+    print "Average move:       %.1f points" % average
+
+    filename = dictionary + Leaves.SUFFIX
+    Leaves.build(stats, average, filename)
+    table = Leaves.LeaveTable(filename)
+    print "Table:              %s (%d leaves)" % (filename, len(table))
+    values = [(table.value([tile]), tile)
+            for tile in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"]
+    values.sort()
+    print "Best tiles:         " + " ".join(["%s %+.1f" % (tile, value)
+            for value, tile in values[:-6:-1]])
+    print "Worst tiles:        " + " ".join(["%s %+.1f" % (tile, value)
+            for value, tile in values[:5]])
@@ -12,14 +12,16 @@ TURN_X = 3 # x and y coordinates of the start of the thing that says "X's turn"
 TURN_Y = 17
 MSG_X = 34 # coordinates of error message location
 MSG_Y = 19
-#UNDO_X = 20 # position of undo button (not currently implemented)
-#UNDO_Y = 5
 SUBMIT_X = 20
 SUBMIT_Y = 5
 CHALLENGE_X = 20 # position of challenge button
 CHALLENGE_Y = 7
 QUIT_X = 20 # position of quit button
 QUIT_Y = 9
+HINT_X = 20 # position of hint button
+HINT_Y = 11
+UNDO_X = 20 # position of undo button
+UNDO_Y = 13
 SHUFFLE_X = 2
 SHUFFLE_Y = 21
 RECALL_X = 11
@@ -34,6 +36,8 @@ BOARDSTART_X = 0 # location of scrabble board
 BOARDSTART_Y = 0
 CENTER_X = 7 # Position of center square
 CENTER_Y = 7
+ACROSS = 0 # Directions a word can run in
+DOWN = 1
 SCORE_SPC = 9 # Space between two players' scores
 BAR_HORIZ = 16 # Position of standout bars
 BAR_VERT = 16
@@ -53,9 +57,11 @@ KEY_U = 117
 KEY_B = 98
 KEY_N = 110
 KEY_Q = 113
+KEY_QUESTION = 63
 KEY_BACKSPACE = 8
 KEY_DEL = 127
 KEY_ESC = 27
+KEY_EOF = -1 # No more input (headless display only)
 
 # Color pairs
 BKGROUND = 1 # black background
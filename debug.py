@@ -1,6 +1,128 @@
 #!/usr/bin/python
 
-def log(msg):
-    log = open("log.txt", "a")
-    log.write(msg + "\n")
-    log.close()
+# Debug log.  Each record is a dictionary (an event name plus whatever
+# fields go with it, such as the turn, the player and the squares played),
+# written to log.txt as one line of JSON.  Records are kept in memory and
+# written out in batches by a background thread, so logging never opens the
+# file or waits for the disk on the caller's thread; whatever is left is
+# written when the program exits.
+#
+# Logging is off unless level is raised (scrabble.py does this for -d).
+# Every call site checks the level first:
+#
+#     if debug.level >= debug.INFO:
+#         debug.log(debug.INFO, "turn", player=player.name)
+#
+# so while logging is off a call site costs one comparison, and the record
+# (and any squares or timings in it) is never built.
+
+import atexit
+import json
+import threading
+import time
+
+# Levels, least detailed first
+OFF = 0
+INFO = 1
+DEBUG = 2
+levelNames = {INFO: "info", DEBUG: "debug"}
+
+# Current level: records above it aren't logged
+level = OFF
+
+FILENAME = "log.txt"
+
+# Seconds between batches
+FLUSH_INTERVAL = 1.0
+
+# A batch is written early once this many records are waiting
+MAX_WAITING = 1000
+
+# This class collects records and writes them to a file from a background
+# thread.  The thread is started by the first record.
+class Logger:
+    def __init__(self, filename):
+        self.filename = filename
+        self.waiting = [] # Records not yet written
+        self.lock = threading.Lock() # Guards waiting
+        self.writeLock = threading.Lock() # Held while writing the file
+        self.wake = threading.Event() # Set to write a batch now
+        self.thread = None
+        self.closed = False
+
+    def add(self, record):
+        self.lock.acquire()
+        try:
+            self.waiting.append(record)
+            full = len(self.waiting) >= MAX_WAITING
+        finally:
+            self.lock.release()
+        if self.thread is None:
+            self.start()
+        if full:
+            self.wake.set()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="debug log")
+        self.thread.daemon = True
+        self.thread.start()
+        atexit.register(self.close)
+
+    # Writes a batch every FLUSH_INTERVAL seconds, or sooner if woken
+    def run(self):
+        while not self.closed:
+            self.wake.wait(FLUSH_INTERVAL)
+            self.wake.clear()
+            self.flush()
+
+    # Writes every waiting record to the file
+    def flush(self):
+        self.lock.acquire()
+        try:
+            records = self.waiting
+            self.waiting = []
+        finally:
+            self.lock.release()
+        if len(records) == 0:
+            return
+        lines = [json.dumps(record, sort_keys=True) + "\n"
+                for record in records]
+        self.writeLock.acquire()
+        try:
+            logFile = open(self.filename, "a")
+            try:
+                logFile.writelines(lines)
+            finally:
+                logFile.close()
+        finally:
+            self.writeLock.release()
+
+    # Stops the background thread and writes what's left
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread is not None:
+            self.wake.set()
+            self.thread.join()
+        self.flush()
+
+logger = Logger(FILENAME)
+
+# Logs an event at a level, with any fields given.  Call sites check the
+# level before calling (see the top of this file).
+def log(eventLevel, event, **fields):
+    if eventLevel > level:
+        return
+    fields["event"] = event
+    fields["level"] = levelNames[eventLevel]
+    fields["time"] = round(time.time(), 3)
+    logger.add(fields)
+
+# Squares (from the board) as [x, y, letter] lists, for a record
+def squares(squareList):
+    return [[square.x, square.y, square.letter] for square in squareList]
+
+# Writes out the records logged so far, without waiting for the next batch
+def flush():
+    logger.flush()
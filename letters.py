@@ -1,6 +1,7 @@
 #!/usr/bin/python
 
-# Letter scores and frequencies
+# Letter scores and frequencies.  A blank is "." on a rack or in the bag;
+# on the board it is stored as the lower-case letter it stands for.
 
 score = { 
 'A': 1, \
@@ -28,8 +29,8 @@ score = {
 'W': 4, \
 'X': 8, \
 'Y': 4, \
-'Z': 10 }
-#'.': 0 }
+'Z': 10, \
+'.': 0 }
 
 frequency = {
 'A': 9, \
@@ -57,5 +58,19 @@ frequency = {
 'W': 2, \
 'X': 1, \
 'Y': 2, \
-'Z': 1 }
-#'.': 2 }
+'Z': 1, \
+'.': 2 }
+
+BLANK = "."
+
+# Blanks score nothing, whatever letter they stand for
+for letter in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+    score[letter.lower()] = 0
+del letter
+
+# Returns the tile that goes on the board as a letter: a blank for a
+# lower-case letter, or else the letter itself
+def tileFor(letter):
+    if letter.islower():
+        return BLANK
+    return letter
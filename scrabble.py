@@ -1,7 +1,10 @@
 #!/usr/bin/python
 
 from optparse import OptionParser
+import sys
 import Game
+import Journal
+import debug
 from constants import *
 
 # Options processing
@@ -10,9 +13,32 @@ parser.add_option("-c", "--challenge", action="store_true", dest="challenge",
        default=False, help="Enable challenges (disabled by default)")
 parser.add_option("-i", "--intl", action="store_true", dest="intl",
         default=False, help="Enable international dictionary")
+parser.add_option("--headless", action="store_true", dest="headless",
+        default=False, help="Run without a screen, reading keypresses " + \
+        "from standard input")
+parser.add_option("--seed", type="int", dest="seed", default=None,
+        help="Seed for drawing tiles (the same seed draws the same tiles)")
+parser.add_option("-d", "--debug", action="count", dest="debug",
+        default=0, help="Write a debug log to " + debug.FILENAME + \
+        " (-dd for more detail)")
+parser.add_option("-r", "--resume", action="store_true", dest="resume",
+        default=False, help="Carry on with the game in the journal")
+parser.add_option("--journal", dest="journal", default=Journal.FILENAME,
+        help="File to record the game in (default " + Journal.FILENAME + \
+        ")")
 (opts, args) = parser.parse_args()
+debug.level = min(opts.debug, debug.DEBUG)
 
-# Create a game
-game = Game.Game(opts.intl, opts.challenge)
+# Create a game, or rebuild the one in the journal
+if opts.resume:
+    try:
+        game = Journal.resume(opts.journal, opts.headless, opts.seed)
+    except (IOError, ValueError), error:
+        sys.exit("Cannot resume: " + str(error))
+else:
+    game = Game.Game(opts.intl, opts.challenge, opts.headless,
+            seed=opts.seed)
+game.journal = Journal.Journal(game, opts.journal)
 
 game.startGame()
+game.journal.close()
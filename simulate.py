@@ -0,0 +1,112 @@
+#!/usr/bin/python
+
+# Plays complete games between computer players with no screen, to measure
+# how well they play and how fast the engine runs.  Games are played with
+# the real Game and Play rules, spread over a pool of worker processes, and
+# each one gets its own seed (the first seed plus its number), so a run can
+# be repeated.  One line of JSON per game is written to the output file as
+# each game finishes:
+#
+#   {"game": 3, "seed": 3, "names": ["CPU 1", "CPU 2"],
+#    "scores": [412, 365], "turns": 27, "bingos": [1, 0],
+#    "seconds": 2.18, "slowestTurn": 0.97, "tilesLeft": 0}
+#
+# Run "python simulate.py -h" for the options.
+
+import json
+import time
+import multiprocessing
+from optparse import OptionParser
+import Game
+import Endgame
+
+# Plays one game and returns its results as a dictionary.  task is (game
+# number, seed, intl, players, endgameTime).
+def playGame(task):
+    number, seed, intl, players, endgameTime = task
+    names = ["CPU " + str(i + 1) for i in range(players)]
+    game = Game.Game(intl, False, True, names, seed, players)
+    for player in game.roster:
+        player.endgameTime = endgameTime
+    turns = 0
+    slowestTurn = 0.0
+    start = time.time()
+    while not game.gameOver:
+        turnStart = time.time()
+        game.playTurn()
+        slowestTurn = max(slowestTurn, time.time() - turnStart)
+        turns += 1
+    seconds = time.time() - start
+    bingos = [len([play for play in game.plays
+            if play.player is player and len(play.squares) == 7])
+            for player in game.roster]
+    return {"game": number, "seed": seed, "names": names,
+            "scores": [player.score for player in game.roster],
+            "turns": turns, "bingos": bingos,
+            "seconds": round(seconds, 3),
+            "slowestTurn": round(slowestTurn, 3),
+            "tilesLeft": len(game.bag)}
+
+if __name__ == "__main__":
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-n", "--games", type="int", dest="games",
+            default=100, help="Number of games to play")
+    parser.add_option("-p", "--processes", type="int", dest="processes",
+            default=multiprocessing.cpu_count(),
+            help="Number of worker processes (default: one per CPU)")
+    parser.add_option("-o", "--output", dest="output",
+            default="simulate.jsonl", help="File to write results to")
+    parser.add_option("--players", type="int", dest="players", default=2,
+            help="Computer players in each game")
+    parser.add_option("--seed", type="int", dest="seed", default=0,
+            help="Seed for the first game (the next gets seed + 1, ...)")
+    parser.add_option("--endgame-time", type="float", dest="endgameTime",
+            default=Endgame.TIME_LIMIT, help="Seconds the players " + \
+            "search endgames for (0 to play them like the rest)")
+    parser.add_option("-i", "--intl", action="store_true", dest="intl",
+            default=False, help="Use the international dictionary")
+    (opts, args) = parser.parse_args()
+    if opts.players < 2 or opts.players > 4:
+        parser.error("Scrabble is a game for 2-4 players")
+    endgameTime = opts.endgameTime or None
+
+    tasks = [(i, opts.seed + i, opts.intl, opts.players, endgameTime)
+            for i in range(opts.games)]
+    pool = multiprocessing.Pool(opts.processes)
+    output = open(opts.output, "w")
+    start = time.time()
+    totals = [0] * opts.players
+    wins = [0] * opts.players
+    bingos = 0
+    turns = 0
+    gameSeconds = 0.0
+    try:
+        for result in pool.imap_unordered(playGame, tasks):
+            output.write(json.dumps(result, sort_keys=True) + "\n")
+            output.flush()
+            scores = result["scores"]
+            for i in range(opts.players):
+                totals[i] += scores[i]
+                if scores[i] == max(scores):
+                    wins[i] += 1
+            bingos += sum(result["bingos"])
+            turns += result["turns"]
+            gameSeconds += result["seconds"]
+    finally:
+        output.close()
+        pool.terminate()
+    elapsed = time.time() - start
+    cores = min(opts.processes, multiprocessing.cpu_count())
+
+    games = max(opts.games, 1)
+    print "Games:              %d in %.1f s (%d processes)" % (opts.games,
+            elapsed, opts.processes)
+    print "Average scores:     " + ", ".join(["%.1f" % (total / float(games))
+            for total in totals])
+    print "Wins (with ties):   " + ", ".join([str(win) for win in wins])
+    print "Bingos per game:    %.2f" % (bingos / float(games))
+    print "Turns per game:     %.1f" % (turns / float(games))
+    print "Seconds per game:   %.2f" % (gameSeconds / games)
+    print "Games/s per core:   %.3f (%d cores)" % (opts.games / elapsed /
+            cores, cores)
+    print "Results:            " + opts.output
@@ -0,0 +1,38 @@
+#!/usr/bin/python
+
+# Tests of trying moves on a GameState and taking them back
+
+import unittest
+import Game
+import Lexicon
+import TileBag
+from GameState import GameState
+
+class ExchangeUndoTest(unittest.TestCase):
+    def setUp(self):
+        self.board = Game.Board(Lexicon.Lexicon("TWL06.txt"))
+
+    # Exchanges tiles from a rack with a bag holding bagTiles, takes the
+    # exchange back, and checks that the rack and bag are as they were
+    def exchangeAndUndo(self, bagTiles):
+        bag = TileBag.TileBag({}, 1)
+        bag.addTiles(bagTiles)
+        state = GameState(self.board, bag, ["QVVAEIO", "ABCDEFG"], [0, 0])
+        state.exchange("QVV")
+        state.undo()
+        self.assertEqual(sorted(state.racks[0]), sorted("QVVAEIO"))
+        self.assertEqual(sorted(state.bag.tiles()), sorted(bagTiles))
+        self.assertEqual(state.toMove, 0)
+        self.assertEqual(state.scoreless, 0)
+
+    def testExchange(self):
+        self.exchangeAndUndo("EENRST")
+
+    def testExchangeWithEmptyBag(self):
+        self.exchangeAndUndo("")
+
+    def testExchangeDrawingFewer(self):
+        self.exchangeAndUndo("E")
+
+if __name__ == "__main__":
+    unittest.main()
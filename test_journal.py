@@ -0,0 +1,70 @@
+#!/usr/bin/python
+
+# Tests of recording a game in a journal and resuming it.  Run them with
+#   python -m unittest discover
+
+import os
+import tempfile
+import unittest
+from StringIO import StringIO
+import Game
+import Journal
+from constants import *
+
+class QuitAndResumeTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp()
+        os.close(handle)
+        self.game = Game.Game(False, False, True, ["Al", "Bo"], 1)
+        self.game.journal = Journal.Journal(self.game, self.filename)
+
+    def tearDown(self):
+        self.game.journal.close()
+        os.remove(self.filename)
+
+    # Plays a turn of a game with the cursor at (x, y) and keys pressed,
+    # and returns the player whose turn it was
+    def turn(self, game, keys, x=0, y=0):
+        game.display.keys = StringIO(keys)
+        game.display.moveCursor(x, y)
+        return game.playTurn()
+
+    # Resumes the game in the journal, and returns it with the player who
+    # moves next
+    def resume(self):
+        game = Journal.resume(self.filename, True)
+        return game, self.turn(game, "")
+
+    def testQuitButton(self):
+        self.assertEqual(self.turn(self.game, "\n", QUIT_X, QUIT_Y).name,
+                "Al")
+        game, player = self.resume()
+        self.assertEqual(player.name, "Al")
+        self.assertEqual(sorted(player.rack), sorted(self.game.roster[0].rack))
+
+    def testQuitKey(self):
+        self.turn(self.game, "\n\n", PASS_X, PASS_Y) # Al passes
+        self.assertEqual(self.turn(self.game, "q", QUIT_X, QUIT_Y).name,
+                "Bo")
+        game, player = self.resume()
+        self.assertEqual(player.name, "Bo")
+        self.assertEqual(game.scoreless, 1)
+
+    def testEndOfInput(self):
+        self.turn(self.game, "") # Al runs out of input at once
+        game, player = self.resume()
+        self.assertEqual(player.name, "Al")
+        self.assertEqual(game.turnNumber, self.game.turnNumber + 1)
+
+    def testQuitWhileExchanging(self):
+        al = self.game.roster[0]
+        al.drawTiles(self.game) # So we know which tile to exchange
+        al.newTurn = False
+        self.turn(self.game, "\n" + al.rack[0] + "q", PASS_X, PASS_Y)
+        self.assertEqual(len(al.exchanged), 1)
+        game, player = self.resume()
+        self.assertEqual(player.name, "Al")
+        self.assertEqual(sorted(player.rack), sorted(al.rack + al.exchanged))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+#!/usr/bin/python
+
+# Tests of the move generator and of the tables the board keeps up to date
+# for it.  The moves generated are checked against a brute-force search
+# that tries every word in the word list on every stretch of every row and
+# column, and scores and checks each placement with Play, as a player's
+# play would be.
+
+import re
+import unittest
+from collections import Counter
+import Game
+import MoveGen
+import Play
+import zobrist
+from constants import *
+from letters import BLANK
+
+# Words of each length in a word list, as one string of lines for matching
+# with regular expressions
+wordLines = {}
+
+def wordsOfLength(lexicon, length):
+    if lexicon.filename not in wordLines:
+        lengths = {}
+        for word in lexicon.iterWords():
+            lengths.setdefault(len(word), []).append(word)
+        wordLines[lexicon.filename] = dict([(n, "\n".join(words) + "\n")
+                for n, words in lengths.items()])
+    return wordLines[lexicon.filename].get(length, "")
+
+# Returns the letters that can go on an empty square for a main word
+# running across (or down): those that make a word with the tiles beside
+# it the other way, if there are any
+def crossLetters(board, lexicon, x, y, horizontal):
+    if horizontal:
+        before, after = board.lettersBeside(x, y, 0, 1)
+    else:
+        before, after = board.lettersBeside(x, y, 1, 0)
+    if before == "" and after == "":
+        return ALPHABET
+    return "".join([letter for letter in ALPHABET if lexicon.contains(
+            (before + letter + after).upper())])
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Yields each way of playing the letters of a word from a rack: a list of
+# the letters as they go down, with blanks in lower case
+def tileChoices(letters, rack):
+    if len(letters) == 0:
+        yield []
+        return
+    letter = letters[0]
+    for tile, played in ((letter, letter), (BLANK, letter.lower())):
+        if rack[tile] > 0:
+            rack[tile] -= 1
+            for rest in tileChoices(letters[1:], rack):
+                yield [played] + rest
+            rack[tile] += 1
+
+# Returns every legal play of a rack in a game as a dictionary from the
+# sorted (x, y, letter) tiles of the play to its score and sorted words
+def bruteForceMoves(game, rack):
+    board = game.board
+    lexicon = game.lexicon
+    player = game.roster[0]
+    counts = Counter(rack)
+    moves = {}
+    for horizontal in (True, False):
+        for line in range(BOARDSIZE_X):
+            if horizontal:
+                places = [(pos, line) for pos in range(BOARDSIZE_X)]
+            else:
+                places = [(line, pos) for pos in range(BOARDSIZE_Y)]
+            cells = [board.letterAt(x, y) for x, y in places]
+            # Letters that can go on each square (or the letter on it),
+            # and whether a play covering the square touches the board
+            fits = []
+            touches = []
+            for (x, y), letter in zip(places, cells):
+                if letter is None:
+                    fits.append("[" + "".join([fit for fit in
+                            crossLetters(board, lexicon, x, y, horizontal)
+                            if counts[fit] or counts[BLANK]]) + "]")
+                    touches.append(board.isAnchor(x, y) or
+                            (board.isEmpty() and (x, y) ==
+                            (CENTER_X, CENTER_Y)))
+                else:
+                    fits.append(letter.upper())
+                    touches.append(True)
+            for start in range(len(places)):
+                if start > 0 and cells[start - 1] is not None:
+                    continue
+                for end in range(start + 2, len(places) + 1):
+                    if end < len(places) and cells[end] is not None:
+                        continue
+                    empty = [pos for pos in range(start, end)
+                            if cells[pos] is None]
+                    if len(empty) == 0 or len(empty) > len(rack) or \
+                            not any(touches[start:end]) or \
+                            "[]" in fits[start:end]:
+                        continue
+                    pattern = re.compile("^" + "".join(fits[start:end]) +
+                            "$", re.M)
+                    for word in pattern.findall(wordsOfLength(lexicon,
+                            end - start)):
+                        needed = [word[pos - start] for pos in empty]
+                        for played in tileChoices(needed, counts):
+                            tiles = [places[pos] + (letter,)
+                                    for pos, letter in zip(empty, played)]
+                            checkPlay(game, player, tiles, moves)
+    return moves
+
+# Puts tiles on the board as a play, and adds it to moves if it is legal
+# and every word it makes is in the word list
+def checkPlay(game, player, tiles, moves):
+    for x, y, letter in tiles:
+        game.board.changeLetter(x, y, letter)
+        player.used.append(game.board.square(x, y))
+    play = Play.Play(game, player)
+    if play.isLegal(game) and play.isValid(game):
+        moves[tuple(sorted(tiles))] = (play.score, sorted(play.words))
+    for x, y, letter in tiles:
+        game.board.changeLetter(x, y, None)
+    player.used = []
+
+# The moves generated for a rack, in the same form as bruteForceMoves
+def generatedMoves(test, game, rack):
+    moves = {}
+    for move in MoveGen.generateMoves(game.board, rack, game.lexicon):
+        key = tuple(sorted(move.tiles))
+        test.assertFalse(key in moves, "Generated twice: %r" % (move,))
+        moves[key] = (move.score, sorted(move.words))
+    return moves
+
+# Returns a game between two computer players after some turns
+def playedGame(seed, turns):
+    game = Game.Game(False, False, True, ["A", "B"], seed, 2)
+    for player in game.roster:
+        player.timeLimit = 60 # Look at every move, so the game is repeatable
+        player.endgameTime = None
+    for turn in range(turns):
+        game.playTurn()
+    return game
+
+class MoveGenTest(unittest.TestCase):
+    def checkRack(self, game, rack):
+        expected = bruteForceMoves(game, rack)
+        self.assertTrue(expected)
+        found = generatedMoves(self, game, rack)
+        self.assertEqual(sorted(found.keys()), sorted(expected.keys()))
+        for key in expected:
+            self.assertEqual(found[key], expected[key], key)
+        self.assertEqual(MoveGen.bestScore(game.board, rack, game.lexicon),
+                max([score for score, words in expected.values()]))
+
+    def testFirstMove(self):
+        game = playedGame(1, 0)
+        self.checkRack(game, list("QUIZERS"))
+        self.checkRack(game, list("AERT.NG"))
+
+    def testMidGame(self):
+        for seed, turns, rack in ((2, 6, "RETAINS"), (3, 8, "ASFWEIR"),
+                (4, 10, "OREUT.D"), (5, 12, "EEIIOUU")):
+            self.checkRack(playedGame(seed, turns), list(rack))
+
+    def testTwoBlanks(self):
+        self.checkRack(playedGame(6, 8), list("QI.Z."))
+
+class BoardTablesTest(unittest.TestCase):
+    def setUp(self):
+        Game.CHECK_CROSS_CHECKS = True
+
+    def tearDown(self):
+        Game.CHECK_CROSS_CHECKS = False
+
+    # Checks the board's Zobrist hash and each rack's against ones worked
+    # out from scratch
+    def checkHashes(self, game):
+        self.assertEqual(game.board.hash, zobrist.boardHash(game.board))
+        for player in game.roster:
+            self.assertEqual(player.rackHash,
+                    zobrist.rackHash(player.rack, 0))
+
+    # Plays a game between computer players with the cross-check tables
+    # checked after every change to the board (see
+    # Game.Board.checkCrossChecks), then takes every turn back
+    def testWholeGame(self):
+        game = Game.Game(False, False, True, ["A", "B"], 7, 2)
+        for player in game.roster:
+            player.timeLimit = 60
+            player.endgameTime = None
+        while not game.gameOver:
+            game.playTurn()
+            self.checkHashes(game)
+        while game.history.undo() is not None:
+            self.checkHashes(game)
+        self.assertTrue(game.board.isEmpty())
+
+if __name__ == "__main__":
+    unittest.main()
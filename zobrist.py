@@ -0,0 +1,70 @@
+#!/usr/bin/python
+
+# Random keys for Zobrist hashing of game positions.  The hash of a position
+# is the XOR of a key for each tile on each square, a key for each tile on
+# each rack, a key for the player to move and a key for the number of
+# scoreless turns in a row.  Putting down or taking away a tile changes the
+# hash by XORing in that tile's key, so the hash can be kept up to date as
+# the position changes instead of being worked out again.
+#
+# A rack is a multiset, so its keys go by how many copies of a tile there
+# are: the nth copy of a tile on a rack (counting from 0) has its own key,
+# and adding or removing it XORs in rackKeys[player][tile][n].
+#
+# Keys are 64-bit, stored as signed numbers so they stay plain ints.  They
+# come from a fixed seed, so a position hashes the same in every process.
+
+import random
+from constants import BOARDSIZE_X, BOARDSIZE_Y
+
+# Tiles a key is needed for: letters, blanks played as lower-case letters,
+# and "." for a blank on a rack
+TILES = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz."
+MAX_PLAYERS = 4
+RACK_SIZE = 7
+MAX_SCORELESS = 3 * MAX_PLAYERS
+SEED = 0x5c7abb1e
+
+# Returns a random 64-bit key as a signed number
+def randomKey(rng):
+    key = rng.getrandbits(64)
+    if key >= 1 << 63:
+        key -= 1 << 64
+    return key
+
+rng = random.Random(SEED)
+
+# squareKeys[y*15+x][tile]
+squareKeys = [dict([(tile, randomKey(rng)) for tile in TILES])
+        for i in range(BOARDSIZE_X * BOARDSIZE_Y)]
+
+# rackKeys[player][tile][n], for the nth copy of a tile on a rack
+rackKeys = [dict([(tile, [randomKey(rng) for n in range(RACK_SIZE)])
+        for tile in TILES]) for player in range(MAX_PLAYERS)]
+
+# turnKeys[player], for the player to move
+turnKeys = [randomKey(rng) for player in range(MAX_PLAYERS)]
+
+# scorelessKeys[n], for n scoreless turns in a row
+scorelessKeys = [randomKey(rng) for n in range(MAX_SCORELESS + 1)]
+
+del rng
+
+# Hash of the tiles on a board
+def boardHash(board):
+    key = 0
+    for i in range(len(board.letters)):
+        if board.letters[i]:
+            key ^= squareKeys[i][chr(board.letters[i])]
+    return key
+
+# Hash of the tiles on a rack belonging to a player (numbered from 0)
+def rackHash(rack, player):
+    key = 0
+    counts = {}
+    keys = rackKeys[player]
+    for tile in rack:
+        n = counts.get(tile, 0)
+        key ^= keys[tile][n]
+        counts[tile] = n + 1
+    return key